@@ -0,0 +1,170 @@
+"""
+Headless HTTP API over the retrieval and answering pipeline, without the Streamlit UI.
+
+Run from the `app` folder:
+    uvicorn api:api --host 0.0.0.0 --port 8000
+
+Endpoints:
+- POST /ask: answer a question, from stored abstracts or abstracts fetched from PubMed.
+- POST /chat: follow-up conversation about a stored query, with the history kept per session.
+- GET /queries: list the stored queries.
+- DELETE /queries/{query_id}: delete a stored query with its vector index.
+- GET /metrics: worker pool load, counters of coalesced identical work and query classification statistics.
+
+With "stream": true, /ask and /chat answer with newline-delimited JSON events: first the metadata
+(query ID, sources, ...), then {"delta": ...} events with the answer as it is generated.
+When all workers are busy and the wait queue is full, requests are rejected with 429.
+"""
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from langchain_core.documents.base import Document
+from components.agent import ChatAgent
+from components.prompts import chat_prompt_template
+from components.llm import llm
+from backend.utils.query_classifier import classify_query, default_classifier
+from backend.utils.query_handlers import get_handler_for_query_type
+from backend.utils.session_history import SessionHistoryStore
+from backend.utils.single_flight import single_flight_stats
+from backend.utils.worker_pool import QueueFullError, WorkerPool
+from services import answer_pipeline, data_repository, lifecycle_manager, rag_client
+import services
+
+worker_pool = WorkerPool(
+    max_workers=int(os.getenv("API_WORKERS", "4")),
+    max_queue=int(os.getenv("API_MAX_QUEUE", "16")),
+)
+session_histories = SessionHistoryStore()
+chat_agent = ChatAgent(prompt=chat_prompt_template, llm=llm, history_factory=session_histories.get)
+
+
+class AskRequest(BaseModel):
+    question: str
+    stream: bool = False
+
+
+class ChatRequest(BaseModel):
+    query_id: str
+    question: str
+    session_id: Optional[str] = None
+    stream: bool = False
+
+
+def format_sources(documents: List[Document]) -> List[Dict]:
+    return [dict(doc.metadata) for doc in documents]
+
+
+def ask_events(question: str) -> Iterator[Dict]:
+    query_type = classify_query(question)
+    if query_type != "scientific":
+        yield {"query_type": query_type}
+        yield {"delta": get_handler_for_query_type(query_type)(question)}
+        return
+
+    query_id, vector_index, is_new_query = answer_pipeline.get_vector_index(question)
+    if query_id is None:
+        yield {"query_type": query_type, "error": "No relevant scientific abstracts found."}
+        return
+    documents = answer_pipeline.retrieve_documents(vector_index, question)
+    yield {"query_type": query_type, "query_id": query_id, "new_query": is_new_query, "sources": format_sources(documents)}
+    for delta in answer_pipeline.stream_answer(question, documents):
+        yield {"delta": delta}
+
+
+def chat_events(query_id: str, question: str, session_id: str) -> Iterator[Dict]:
+    lifecycle_manager.record_access(query_id)
+    vector_index = rag_client.get_vector_index_by_user_query(query_id)
+    documents = chat_agent.retrieve_documents(vector_index, question)
+    yield {"query_id": query_id, "session_id": session_id, "sources": format_sources(documents)}
+    retrieved_abstracts = chat_agent.format_retreieved_abstracts_for_prompt(documents)
+    # One history per session and query, as the UI starts a new conversation when switching query
+    for delta in chat_agent.stream_answer_from_llm(question, retrieved_abstracts, f"{session_id}:{query_id}"):
+        yield {"delta": delta}
+
+
+def collect_events(events: Iterator[Dict]) -> Dict:
+    """ Merge the events of a response into one JSON object, with the deltas joined into "answer". """
+    response, answer = {}, []
+    for event in events:
+        if "delta" in event:
+            answer.append(event["delta"])
+        else:
+            response.update(event)
+    if "error" not in response:
+        response["answer"] = "".join(answer)
+    return response
+
+
+async def stream_lines(make_events) -> AsyncIterator[str]:
+    try:
+        async for event in worker_pool.stream(make_events):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+    except QueueFullError as e:
+        # Filled up between the capacity check and the start of the body, the status is already sent
+        yield json.dumps({"error": f"Server busy: {e}"}) + "\n"
+
+
+async def respond(make_events, stream: bool):
+    if stream:
+        # Reject with 429 while we still can; the worker is only reserved once the body is iterated, so a
+        # client disconnecting before that holds no slot
+        worker_pool.check_capacity()
+        return StreamingResponse(stream_lines(make_events), media_type="application/x-ndjson")
+    response = await worker_pool.run(lambda: collect_events(make_events()))
+    if "error" in response:
+        raise HTTPException(status_code=404, detail=response["error"])
+    return response
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    services.start_background_tasks()
+    yield
+
+
+api = FastAPI(title="Medical Research chatbot API", lifespan=lifespan)
+
+
+@api.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError) -> JSONResponse:
+    return JSONResponse(status_code=429, content={"detail": f"Server busy: {exc}"}, headers={"Retry-After": "1"})
+
+
+@api.post("/ask")
+async def ask(request: AskRequest):
+    return await respond(lambda: ask_events(request.question), request.stream)
+
+
+@api.post("/chat")
+async def chat(request: ChatRequest):
+    if request.query_id not in data_repository.get_list_of_queries():
+        raise HTTPException(status_code=404, detail=f"Unknown query {request.query_id}")
+    session_id = request.session_id or str(uuid.uuid4())
+    return await respond(lambda: chat_events(request.query_id, request.question, session_id), request.stream)
+
+
+@api.get("/queries")
+async def list_queries() -> Dict[str, str]:
+    return data_repository.get_list_of_queries()
+
+
+@api.delete("/queries/{query_id}")
+async def delete_query(query_id: str) -> Dict[str, str]:
+    if query_id not in data_repository.get_list_of_queries():
+        raise HTTPException(status_code=404, detail=f"Unknown query {query_id}")
+    await worker_pool.run(lifecycle_manager.delete_query, query_id)
+    return {"deleted": query_id}
+
+
+@api.get("/metrics")
+async def metrics() -> Dict:
+    return {
+        "workers": {"admitted": worker_pool.admitted, "max_workers": worker_pool.max_workers, "max_queue": worker_pool.max_queue},
+        "single_flight": single_flight_stats(),
+        "query_classifier": default_classifier.stats.summary(),
+    }
\ No newline at end of file
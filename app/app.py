@@ -1,26 +1,26 @@
 import streamlit as st
-from metapub import PubMedFetcher
 from components.agent import ChatAgent
-from components.prompts import chat_prompt_template, qa_template
+from components.prompts import chat_prompt_template
 from components.llm import llm
 from components.layout_extension import render_app_info
-from backend.retriever import PubMedAbstractRetriever
-from backend.data.local_data_store import LocalJSONStore
-from backend.rag_pipeline.chromadb import ChromaDbRag
-from backend.rag_pipeline.embeddings import GeminiEmbeddingModel
 from backend.utils.query_classifier import classify_query
 from backend.utils.query_handlers import get_handler_for_query_type
-import os
-from dotenv import load_dotenv
-load_dotenv()
+from services import answer_pipeline, data_repository, lifecycle_manager, rag_client
+import services
 
 # Instantiate objects
-embeddings = GeminiEmbeddingModel(api_key=os.getenv("GOOGLE_API_KEY"))
-pubmed_client = PubMedAbstractRetriever(PubMedFetcher())
-data_repository = LocalJSONStore(storage_folder_path="backend/data")
-rag_client = ChromaDbRag(persist_directory="backend/chromadb_storage", embeddings=embeddings)
 chat_agent = ChatAgent(prompt=chat_prompt_template, llm=llm)
 
+
+@st.cache_resource
+def start_background_tasks() -> list:
+    """ Start the background tasks (query refresh, embedding migration) once per server process. """
+    return services.start_background_tasks()
+
+
+start_background_tasks()
+
+
 def main():
     st.set_page_config(
         page_title="Pubmed Abstract Screener",
@@ -59,43 +59,20 @@ def main():
                         
                         if query_type == "scientific":
                             # Xử lý câu hỏi khoa học sử dụng RAG pipeline
-                            # Normalize query for comparison
-                            normalized_query = scientist_question.strip().lower()
-
-                            # Check if the query already exists in the database
-                            query_list = data_repository.get_list_of_queries()
-                            existing_query_id = next(
-                                (qid for qid, qtext in query_list.items() if qtext.strip().lower() == normalized_query),
-                                None
-                            )
-
-                            if existing_query_id:
-                                # Query exists, retrieve vector index and skip fetching abstracts
+                            with st.spinner('Đang tìm kiếm thông tin từ PubMed...'):
+                                # Existing questions reuse their vector index, new ones are fetched from PubMed
+                                query_id, vector_index, is_new_query = answer_pipeline.get_vector_index(scientist_question)
+                            if query_id is None:
+                                st.write('Không tìm thấy bài báo khoa học liên quan.')
+                                return
+                            if not is_new_query:
                                 st.write("Đã tìm thấy câu hỏi này trong cơ sở dữ liệu. Đang sử dụng dữ liệu có sẵn...")
-                                vector_index = rag_client.get_vector_index_by_user_query(existing_query_id)
-                            else:
-                                # Query does not exist, fetch data from PubMed
-                                with st.spinner('Đang tìm kiếm thông tin từ PubMed...'):
-                                    retrieved_abstracts = pubmed_client.get_abstract_data(scientist_question)
-                                    if not retrieved_abstracts:
-                                        st.write('Không tìm thấy bài báo khoa học liên quan.')
-                                        return
-                                    # Save abstracts to storage and create vector index
-                                    query_id = data_repository.save_dataset(retrieved_abstracts, scientist_question)
-                                    documents = data_repository.create_document_list(retrieved_abstracts)
-                                    rag_client.create_vector_index_for_user_query(documents, query_id)
-                                    vector_index = rag_client.get_vector_index_by_user_query(query_id)
 
                             # Answer the user question and display the answer on the UI directly
-                            retrieved_documents = chat_agent.retrieve_documents(vector_index, scientist_question)
-                            chain = qa_template | llm
-                            
+                            retrieved_documents = answer_pipeline.retrieve_documents(vector_index, scientist_question)
+
                             with st.spinner('Đang tạo câu trả lời từ thông tin khoa học...'):
-                                response = chain.invoke({
-                                    "question": scientist_question,
-                                    "retrieved_abstracts": retrieved_documents,
-                                }).content
-                                st.write(response)
+                                st.write_stream(answer_pipeline.stream_answer(scientist_question, retrieved_documents))
                         else:
                             # Xử lý các loại câu hỏi khác (translation, summarization, general)
                             handler = get_handler_for_query_type(query_type)
@@ -114,6 +91,7 @@ def main():
         # Initialize chat about some query from the history of user questions
         if selected_query:
             selected_query_id = next(key for key, val in query_options.items() if val == selected_query)
+            lifecycle_manager.record_access(selected_query_id)
             vector_index = rag_client.get_vector_index_by_user_query(selected_query_id)
 
             # Clear chat history when switching query to chat about
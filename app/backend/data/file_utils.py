@@ -0,0 +1,93 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import IO, Iterator
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'w', encoding: str = 'utf-8') -> Iterator[IO]:
+    """
+    Write a file atomically: content goes to a temporary file in the same folder, which is flushed to disk
+    and renamed over the target only once writing succeeded. Readers see either the old or the new file.
+    """
+    folder = os.path.dirname(path) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else encoding) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class FileLock:
+    """
+    Exclusive inter-process lock held on a lock file, usable as a context manager.
+    Blocks until the lock is acquired. One instance can be shared by the threads of a process: they are
+    serialized by a thread lock before taking the file lock, so the handle held in `_file` is their own.
+    Shared locks (`shared=True`) can be held by several instances at once and exclude exclusive ones; on Windows
+    they are exclusive too.
+    """
+
+    def __init__(self, path: str, shared: bool = False):
+        self.path = path
+        self.shared = shared
+        self._file = None
+        self._thread_lock = threading.Lock()
+
+    def acquire(self) -> None:
+        self._thread_lock.acquire()
+        try:
+            self._lock_file()
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def _lock_file(self) -> None:
+        file = open(self.path, 'a+')
+        try:
+            if os.name == 'nt':
+                file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:  # LK_LOCK gives up after ~10 seconds, keep waiting
+                        continue
+            else:
+                fcntl.flock(file.fileno(), fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        except BaseException:
+            file.close()
+            raise
+        self._file = file
+
+    def release(self) -> None:
+        if self._file is None:
+            return
+        try:
+            if os.name == 'nt':
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+            self._thread_lock.release()
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
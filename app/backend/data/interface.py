@@ -1,20 +1,50 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, Optional
 from langchain_core.documents.base import Document
 from backend.data.models import UserQueryRecord, ScientificAbstract
+from backend.utils.text import create_passages
 
 
 class UserQueryDataStore(ABC):
     """Repository for interaction with abstract database"""
 
     @abstractmethod 
-    def save_dataset(self, abstracts_data: List[ScientificAbstract], user_query: str) -> str:
+    def save_dataset(self, abstracts_data: List[ScientificAbstract], user_query: str, search_query: Optional[str] = None) -> str:
         """
         Save abstracts and details about the query to data storage.
         Return string that corresponds to newly assigned query ID.
         """
         raise NotImplementedError
+
+    @abstractmethod
+    def get_query_record(self, query_id: str) -> UserQueryRecord:
+        """
+        Retrieve the details about a query (user query, search query, last fetch time).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_query_record(self, query_record: UserQueryRecord) -> None:
+        """
+        Overwrite the details about an existing query.
+        """
+        raise NotImplementedError
     
+    @abstractmethod
+    def append_to_dataset(self, query_id: str, abstracts_data: List[ScientificAbstract]) -> None:
+        """
+        Add abstracts to the dataset of an existing query.
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def query_update_lock(self, query_id: str):
+        """
+        Inter-process lock (context manager) serializing read-modify-write updates of a query, such as refreshes.
+        Holding it does not block append_to_dataset or update_query_record.
+        """
+        raise NotImplementedError
+
     @abstractmethod 
     def read_dataset(self, query_id: str) -> List[ScientificAbstract]:
         """
@@ -36,6 +66,34 @@ class UserQueryDataStore(ABC):
         """
         raise NotImplementedError
     
+    @abstractmethod
+    def list_dataset_ids(self) -> List[str]:
+        """
+        List IDs of all datasets present in storage, including incomplete ones that are missing from the index.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def record_access(self, query_id: str) -> None:
+        """
+        Mark a dataset as used now. Drives least-recently-used eviction.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_last_access(self, query_id: str) -> float:
+        """
+        Return the timestamp (seconds since epoch) of the last access of a dataset.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_dataset_size(self, query_id: str) -> int:
+        """
+        Return the size of a dataset in storage, in bytes.
+        """
+        raise NotImplementedError
+    
     def create_document_list(self, abstracts_data: List[ScientificAbstract]) -> List[Document]:
         return [
             Document(
@@ -44,6 +102,8 @@ class UserQueryDataStore(ABC):
                     "title": entry.title, 
                     "authors": entry.authors,
                     "year": entry.year,
+                    # DOI, cited by the chat agent
+                    **({"source": entry.doi} if entry.doi else {}),
                 }
             )
             for entry in abstracts_data
@@ -54,8 +114,8 @@ class UserQueryDataStore(ABC):
         query_record = self.read_dataset(query_id)
         return self.create_document_list(query_record)
     
-    def chunk_documents(self, query_id: str) -> List[Document]:
+    def chunk_documents(self, query_id: str, window_size: int = 3, stride: int = 2) -> List[Document]:
         """
-        Read the dataset and chunk it into smaller pieces.
+        Read the dataset and chunk it into smaller pieces: overlapping windows of `window_size` sentences.
         """
-        pass
\ No newline at end of file
+        return create_passages(self.read_documents(query_id), window_size, stride)
\ No newline at end of file
@@ -0,0 +1,221 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Collection, Dict, List, Optional, Sequence, Set
+from backend.data.interface import UserQueryDataStore
+from backend.rag_pipeline.interface import RagWorkflow
+import logging
+
+
+class StorageLifecycleManager:
+    """
+    Keeps abstract datasets and vector indexes in sync: deletes them together, evicts old queries
+    by TTL or least-recent access under a disk budget, and garbage-collects orphans on either side.
+    """
+
+    def __init__(
+        self,
+        data_store: UserQueryDataStore,
+        rag_workflow: RagWorkflow,
+        disk_budget_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        orphan_grace_seconds: float = 3600,
+        storage_paths: Optional[Sequence[str]] = None,
+        on_delete: Optional[Callable[[str], None]] = None,
+    ):
+        """
+        Args:
+        - data_store (UserQueryDataStore): Store holding the abstract datasets.
+        - rag_workflow (RagWorkflow): Workflow holding the vector indexes.
+        - disk_budget_bytes (int): Evict least recently accessed queries while storage exceeds this size.
+        - ttl_seconds (float): Evict queries not accessed for longer than this.
+        - orphan_grace_seconds (float): Leave orphans younger than this alone, they may belong to a save in progress.
+        - storage_paths (Sequence[str]): Folders counted against the disk budget. Defaults to the storage folders
+          of the data store and the vector backend.
+        - on_delete (Callable[[str], None]): Called with the query ID after a query is deleted or evicted, for
+          storage derived from the datasets (e.g. the corpus index of local-first answering).
+        """
+        self.data_store = data_store
+        self.rag_workflow = rag_workflow
+        self.disk_budget_bytes = disk_budget_bytes
+        self.ttl_seconds = ttl_seconds
+        self.orphan_grace_seconds = orphan_grace_seconds
+        self.storage_paths = storage_paths or [
+            path for path in (
+                getattr(data_store, 'storage_folder_path', None),
+                getattr(rag_workflow, 'persist_directory', None),
+            ) if path
+        ]
+        self.on_delete = on_delete
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-evict")
+        self._evict_task: Optional[Future] = None
+        # Queries whose ingest triggered an eviction that has not finished yet, never evicted by it
+        self._keep: Set[str] = set()
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def record_access(self, query_id: str) -> None:
+        """
+        Mark a query as used, e.g. when its vector index is opened for answering or chatting.
+        """
+        self.data_store.record_access(query_id)
+
+    def delete_query(self, query_id: str) -> None:
+        """
+        Delete the dataset and the vector index of a query together.
+        """
+        self.rag_workflow.delete_vector_index(query_id)
+        self.data_store.delete_dataset(query_id)
+        self.logger.info(f'Query {query_id} has been deleted.')
+        if self.on_delete:
+            self.on_delete(query_id)
+
+    def disk_usage(self) -> int:
+        """
+        Total size in bytes of the storage folders, without the files of the vector backend that deleting
+        queries does not shrink (e.g. the Chroma database): they cannot be brought within a budget by eviction.
+        """
+        shared_files = {os.path.abspath(path) for path in self.rag_workflow.list_shared_files()}
+        total = 0
+        for storage_path in self.storage_paths:
+            for root, _, files in os.walk(storage_path):
+                for name in files:
+                    if os.path.abspath(os.path.join(root, name)) in shared_files:
+                        continue
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except FileNotFoundError:
+                        continue
+        return total
+
+    def evict(self, now: Optional[float] = None, keep: Collection[str] = ()) -> List[str]:
+        """
+        Delete queries whose TTL expired, then the least recently accessed ones until usage fits the disk budget.
+        Queries in `keep` are never evicted. Returns the evicted query IDs.
+        """
+        now = now or time.time()
+        by_last_access = sorted(self.data_store.get_list_of_queries(), key=self.data_store.get_last_access)
+        evicted = []
+
+        if self.ttl_seconds is not None:
+            for query_id in list(by_last_access):
+                if query_id in keep:
+                    continue
+                if now - self.data_store.get_last_access(query_id) > self.ttl_seconds:
+                    self.delete_query(query_id)
+                    by_last_access.remove(query_id)
+                    evicted.append(query_id)
+
+        if self.disk_budget_bytes is not None:
+            # Scan the storage folders once, then subtract what every deletion frees
+            usage = self.disk_usage()
+            while usage > self.disk_budget_bytes and by_last_access:
+                query_id = by_last_access.pop(0)
+                if query_id in keep:
+                    continue
+                freed = self.data_store.get_dataset_size(query_id) + self.rag_workflow.get_index_size(query_id)
+                self.delete_query(query_id)
+                evicted.append(query_id)
+                usage -= freed
+            if usage > self.disk_budget_bytes:
+                self.logger.warning(f'Storage uses {usage} bytes, still above the budget of {self.disk_budget_bytes}.')
+
+        if evicted:
+            self.logger.info(f'Evicted queries: {evicted}')
+        return evicted
+
+    def evict_in_background(self, query_id: Optional[str] = None) -> None:
+        """
+        Start an eviction unless one is already running, so that requests do not wait for it.
+        `query_id`, the query that triggered it, is kept until an eviction started after this call has finished.
+        """
+        with self._lock:
+            if query_id is not None:
+                self._keep.add(query_id)
+            if self._evict_task is None or self._evict_task.done():
+                self._evict_task = self.executor.submit(self._evict_logged)
+
+    def _evict_logged(self) -> List[str]:
+        with self._lock:
+            kept = set(self._keep)
+        try:
+            # The live set, so that queries added while this eviction runs are kept too
+            return self.evict(keep=self._keep)
+        except Exception as e:
+            self.logger.error(f'Evicting queries failed: {e}')
+            return []
+        finally:
+            with self._lock:
+                self._keep -= kept
+
+    def find_orphans(self, now: Optional[float] = None) -> Dict[str, List[str]]:
+        """
+        Find vector indexes without a dataset and datasets without a vector index or without query details.
+        """
+        now = now or time.time()
+        indexed_queries = set(self.data_store.get_list_of_queries())
+        dataset_ids = set(self.data_store.list_dataset_ids())
+        vector_indexes = set(self.rag_workflow.list_vector_indexes())
+
+        orphan_datasets = [
+            query_id for query_id in sorted(dataset_ids)
+            if (query_id not in vector_indexes or query_id not in indexed_queries)
+            and now - self.data_store.get_last_access(query_id) > self.orphan_grace_seconds
+        ]
+        orphan_indexes = sorted(vector_indexes - dataset_ids)
+        return {'datasets': orphan_datasets, 'vector_indexes': orphan_indexes}
+
+    def collect_garbage(self, dry_run: bool = False) -> Dict[str, List[str]]:
+        """
+        Delete orphaned datasets and vector indexes, then let the vector backend reclaim disk space if it can.
+        """
+        orphans = self.find_orphans()
+        if dry_run:
+            return orphans
+
+        for query_id in orphans['datasets']:
+            self.delete_query(query_id)
+        for query_id in orphans['vector_indexes']:
+            self.rag_workflow.delete_vector_index(query_id)
+        if hasattr(self.rag_workflow, 'compact'):
+            orphans['compacted'] = self.rag_workflow.compact()
+        return orphans
+
+
+if __name__ == "__main__":
+    from backend.data.local_data_store import LocalJSONStore
+    from backend.rag_pipeline.chromadb import ChromaDbRag
+    from backend.rag_pipeline.quantized import QuantizedRag
+
+    parser = argparse.ArgumentParser(description="Evict old queries and clean up orphaned storage.")
+    parser.add_argument("command", choices=["gc", "evict", "usage"])
+    parser.add_argument("--data-path", default="backend/data")
+    parser.add_argument("--vector-path", default=None)
+    parser.add_argument("--backend", choices=["chroma", "quantized"], default="chroma")
+    parser.add_argument("--budget-mb", type=float, default=None, help="Disk budget for eviction, in MB.")
+    parser.add_argument("--ttl-days", type=float, default=None, help="Evict queries not accessed for this long.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report orphans for gc.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # Embeddings are not needed to list or delete vector indexes
+    if args.backend == "chroma":
+        rag = ChromaDbRag(persist_directory=args.vector_path or "backend/chromadb_storage", embeddings=None)
+    else:
+        rag = QuantizedRag(persist_directory=args.vector_path or "backend/quantized_storage", embeddings=None)
+    manager = StorageLifecycleManager(
+        LocalJSONStore(storage_folder_path=args.data_path),
+        rag,
+        disk_budget_bytes=int(args.budget_mb * 1e6) if args.budget_mb is not None else None,
+        ttl_seconds=args.ttl_days * 86400 if args.ttl_days is not None else None,
+    )
+
+    if args.command == "gc":
+        print(manager.collect_garbage(dry_run=args.dry_run))
+    elif args.command == "evict":
+        print(manager.evict())
+    else:
+        print(f'{manager.disk_usage() / 1e6:.2f} MB')
@@ -1,20 +1,53 @@
+import io
 import json
 import os
 import re
 import shutil
-from typing import Dict, List
+from datetime import datetime
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional
+from langchain_core.documents.base import Document
 from backend.data.models import UserQueryRecord, ScientificAbstract
 from backend.data.interface import UserQueryDataStore
+from backend.data.file_utils import FileLock, atomic_write
 import logging
 
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+
+# Storage format -> file name of the abstracts dataset inside a query folder
+DATASET_FILE_NAMES = {
+    "jsonl": "abstracts.jsonl",
+    "jsonl.zst": "abstracts.jsonl.zst",
+    "json": "abstracts.json",  # legacy pretty-printed format, read-only fallback
+}
+LAST_ACCESS_FILE_NAME = '.last_access'
+
 
 class LocalJSONStore(UserQueryDataStore):
     """ 
     For local testing, to simulate database via local JSON files. 
     """
 
-    def __init__(self, storage_folder_path: str):
+    def __init__(self, storage_folder_path: str, storage_format: str = "jsonl", compression_level: int = 3):
+        """
+        Args:
+        - storage_folder_path (str): Root folder of the store.
+        - storage_format (str): Format used for new datasets: "jsonl" (one compact JSON record per line),
+          "jsonl.zst" (zstd-compressed JSON Lines, requires the `zstandard` package) or "json" (legacy).
+          Datasets written in any of the formats can always be read.
+        - compression_level (int): zstd compression level used by "jsonl.zst".
+        """
+        if storage_format not in DATASET_FILE_NAMES:
+            raise ValueError(f"Unknown storage format '{storage_format}', expected one of {list(DATASET_FILE_NAMES)}.")
+        if storage_format == "jsonl.zst" and zstandard is None:
+            raise ImportError("The 'zstandard' package is required for the 'jsonl.zst' storage format.")
+
         self.storage_folder_path = storage_folder_path
+        self.storage_format = storage_format
+        self.compression_level = compression_level
         self.index_file_path = os.path.join(storage_folder_path, 'index.json')
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.INFO)
@@ -22,87 +55,276 @@ class LocalJSONStore(UserQueryDataStore):
         # Đảm bảo thư mục lưu trữ tồn tại
         os.makedirs(self.storage_folder_path, exist_ok=True)
         
+        # Lock serializing query ID allocation and index updates across processes
+        self.index_lock = FileLock(os.path.join(storage_folder_path, '.index.lock'))
+        self._index_mtime = None
+
         # Kiểm tra và tạo file index nếu cần
-        if not os.path.exists(self.index_file_path):
-            with open(self.index_file_path, 'w', encoding='utf-8') as file:
-                json.dump({}, file, ensure_ascii=False, indent=4)
-                
-        self.metadata_index = self._rebuild_index()  # Initialize the index on startup
+        with self.index_lock:
+            if not os.path.exists(self.index_file_path):
+                self._write_json_file(self.index_file_path, {})
+            self.metadata_index = self._rebuild_index()  # Initialize the index on startup
 
     def get_new_query_id(self) -> str:
         """
-        Compute a new query ID by incrementing previous query ID integer suffix by 1.
+        Compute a new query ID by incrementing the highest query ID integer suffix by 1.
+        Both indexed queries and existing query folders (saves still in progress) are taken into account.
         """
         try:
             with open(self.index_file_path, 'r', encoding='utf-8') as file:
                 data = json.load(file)
         except (FileNotFoundError, json.JSONDecodeError):
             data = {}
-            # Tạo file index mới nếu không tồn tại hoặc bị lỗi
-            with open(self.index_file_path, 'w', encoding='utf-8') as file:
-                json.dump(data, file, ensure_ascii=False, indent=4)
                 
-        keys = [k for k in data.keys() if k.startswith('query_')]
+        keys = [k for k in data.keys() if k.startswith('query_')] + self.list_dataset_ids()
         if not keys:
             return 'query_1'
         numbers = [int(k.split('_')[-1]) for k in keys]
         max_number = max(numbers) if numbers else 0
         return f'query_{max_number + 1}'
 
+    def _allocate_query_id(self) -> str:
+        """
+        Reserve a new query ID by creating its folder while holding the index lock,
+        so concurrent saves in other sessions or processes never get the same ID.
+        """
+        with self.index_lock:
+            query_id = self.get_new_query_id()
+            os.makedirs(os.path.join(self.storage_folder_path, query_id))
+        return query_id
+
+    def _get_dataset_file_path(self, query_id: str) -> str:
+        """
+        Locate the abstracts file of a query, preferring the configured storage format.
+        """
+        query_dir = os.path.join(self.storage_folder_path, query_id)
+        formats = [self.storage_format] + [fmt for fmt in DATASET_FILE_NAMES if fmt != self.storage_format]
+        for fmt in formats:
+            path = os.path.join(query_dir, DATASET_FILE_NAMES[fmt])
+            if os.path.exists(path):
+                return path
+        self.logger.error(f'The dataset file for this query: {query_id} was not found.')
+        raise FileNotFoundError('JSON file was not found.')
+
+    def _open_dataset_file(self, path: str) -> IO[str]:
+        """
+        Open a dataset file for reading as a text stream, transparently handling zstd compression.
+        """
+        if not path.endswith('.zst'):
+            return open(path, 'r', encoding='utf-8')
+        if zstandard is None:
+            raise ImportError(f"The 'zstandard' package is required to open {path}.")
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+
+    def _encode_records(self, records: Iterable[Dict[str, Any]], compressed: bool) -> bytes:
+        """
+        One compact JSON record per line, as a single zstd frame if `compressed`.
+        """
+        data = b''.join(
+            json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n' for record in records
+        )
+        return zstandard.ZstdCompressor(level=self.compression_level).compress(data) if compressed else data
+
+    def _write_dataset_file(self, path: str, records: Iterable[Dict[str, Any]]) -> None:
+        """
+        Atomically write abstract records to a dataset file, one compact JSON record per line
+        (zstd-compressed for .zst files, a pretty-printed list for legacy .json files).
+        """
+        with atomic_write(path, 'wb') as raw_file:
+            if path.endswith('.json'):
+                raw_file.write(json.dumps(list(records), indent=4, ensure_ascii=False).encode('utf-8'))
+            else:
+                raw_file.write(self._encode_records(records, compressed=path.endswith('.zst')))
+
+    def _append_dataset_file(self, path: str, records: Iterable[Dict[str, Any]]) -> None:
+        """
+        Append abstract records to a dataset file in place: new lines for .jsonl files, a new frame for .zst files,
+        so the cost does not grow with the size of the dataset. The caller holds the lock of the query.
+        A failed append is truncated away; readers skip a last line that is not complete yet.
+        Legacy .json files cannot be appended to and are rewritten.
+        """
+        if path.endswith('.json'):
+            with open(path, 'r', encoding='utf-8') as file:
+                existing = json.load(file)
+            self._write_dataset_file(path, existing + list(records))
+            return
+        data = self._encode_records(records, compressed=path.endswith('.zst'))
+        with open(path, 'r+b') as file:
+            size = file.seek(0, os.SEEK_END)
+            if not path.endswith('.zst'):
+                size = self._complete_lines_size(file, size)
+            try:
+                file.seek(size)
+                file.truncate()
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            except BaseException:
+                file.truncate(size)
+                raise
+
+    @staticmethod
+    def _complete_lines_size(file: IO[bytes], size: int, chunk_size: int = 65536) -> int:
+        """
+        Size of a JSON Lines file without a trailing partial line, left by an append that was interrupted.
+        """
+        end = size
+        while end > 0:
+            start = max(0, end - chunk_size)
+            file.seek(start)
+            chunk = file.read(end - start)
+            if end == size and chunk.endswith(b'\n'):
+                return size
+            newline = chunk.rfind(b'\n')
+            if newline != -1:
+                return start + newline + 1
+            end = start
+        return 0
+
+    def _write_json_file(self, path: str, data: Any) -> None:
+        """
+        Atomically write a small JSON document (query details, index).
+        """
+        with atomic_write(path) as file:
+            json.dump(data, file, indent=4, ensure_ascii=False)
+
+    def iter_dataset_records(self, query_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream raw abstract records (plain dicts) of a query without loading the whole file.
+        The legacy JSON format cannot be streamed and is loaded at once.
+        """
+        path = self._get_dataset_file_path(query_id)
+        try:
+            if path.endswith('.json'):
+                with open(path, 'r', encoding='utf-8') as file:
+                    yield from json.load(file)
+                return
+            with self._open_dataset_file(path) as file:
+                for line in file:
+                    if not line.endswith('\n'):
+                        break  # an append in progress
+                    if line.strip():
+                        yield json.loads(line)
+        except json.JSONDecodeError as e:
+            self.logger.error(f'Error decoding JSON from file for query {query_id}: {e}')
+            raise ValueError(f'JSON decode error: {e}')
+
+    def iter_dataset(self, query_id: str) -> Iterator[ScientificAbstract]:
+        """
+        Stream abstracts of a query as validated ScientificAbstract objects.
+        """
+        for abstract_record in self.iter_dataset_records(query_id):
+            yield ScientificAbstract(**abstract_record)
+
     def read_dataset(self, query_id: str) -> List[ScientificAbstract]:
         """ 
         Read dataset containing abstracts from local storage. 
         """
+        return list(self.iter_dataset(query_id))
+
+    def iter_documents(self, query_id: str) -> Iterator[Document]:
+        """
+        Fast path: build Documents straight from the stored records, skipping ScientificAbstract validation.
+        Produces the same documents as create_document_list(read_dataset(query_id)).
+        """
+        for record in self.iter_dataset_records(query_id):
+            yield Document(
+                page_content=record['abstract_content'],
+                metadata={
+                    "title": record.get('title'),
+                    "authors": record.get('authors'),
+                    "year": record.get('year'),
+                    **({"source": record['doi']} if record.get('doi') else {}),
+                }
+            )
+
+    def read_documents(self, query_id: str) -> List[Document]:
+        """ Read the dataset and convert it to the required List[Document] """
+        return list(self.iter_documents(query_id))
+
+    def _to_records(self, abstracts_data: List[ScientificAbstract]) -> List[Dict[str, Any]]:
+        """
+        Convert abstracts to plain dicts for storage.
+        """
+        # Chuyển đổi authors từ list thành string trước khi lưu
+        list_of_abstracts = []
+        for model in abstracts_data:
+            abstract_dict = model.model_dump()
+            if isinstance(abstract_dict.get("authors"), list):
+                abstract_dict["authors"] = ", ".join(abstract_dict["authors"])
+            list_of_abstracts.append(abstract_dict)
+        return list_of_abstracts
+
+    def append_to_dataset(self, query_id: str, abstracts_data: List[ScientificAbstract]) -> None:
+        """
+        Append abstracts to the dataset of an existing query. Appends to the same query are serialized
+        by a per-query lock and only write the new records.
+        """
+        query_dir = os.path.join(self.storage_folder_path, query_id)
+        if not os.path.exists(os.path.join(query_dir, 'query_details.json')):
+            raise FileNotFoundError(f'Query {query_id} does not exist.')
+        with FileLock(os.path.join(query_dir, '.lock')):
+            self._append_dataset_file(self._get_dataset_file_path(query_id), self._to_records(abstracts_data))
+        self.logger.info(f"Appended {len(abstracts_data)} abstracts to query ID {query_id}.")
+
+    def query_update_lock(self, query_id: str) -> FileLock:
+        """
+        Inter-process lock serializing read-modify-write updates of a query (separate from the lock of single writes).
+        """
+        query_dir = os.path.join(self.storage_folder_path, query_id)
+        if not os.path.exists(os.path.join(query_dir, 'query_details.json')):
+            raise FileNotFoundError(f'Query {query_id} does not exist.')
+        return FileLock(os.path.join(query_dir, '.update.lock'))
+
+    def get_query_record(self, query_id: str) -> UserQueryRecord:
+        """
+        Read query details of a query from local storage.
+        """
+        query_details_path = os.path.join(self.storage_folder_path, query_id, 'query_details.json')
         try:
-            with open(f'{self.storage_folder_path}/{query_id}/abstracts.json', 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                return [ScientificAbstract(**abstract_record) for abstract_record in data]
+            with open(query_details_path, 'r', encoding='utf-8') as file:
+                return UserQueryRecord(**json.load(file))
         except FileNotFoundError:
-            self.logger.error(f'The JSON file for this query: {query_id} was not found.')
-            raise FileNotFoundError('JSON file was not found.')
-        except json.JSONDecodeError as e:
-            self.logger.error(f'Error decoding JSON from file for query {query_id}: {e}')
-            raise ValueError(f'JSON decode error: {e}')
+            self.logger.error(f'Query details for query: {query_id} were not found.')
+            raise
+
+    def update_query_record(self, query_record: UserQueryRecord) -> None:
+        """
+        Atomically overwrite query details of an existing query.
+        """
+        query_dir = os.path.join(self.storage_folder_path, query_record.user_query_id)
+        if not os.path.exists(os.path.join(query_dir, 'query_details.json')):
+            raise FileNotFoundError(f'Query {query_record.user_query_id} does not exist.')
+        with FileLock(os.path.join(query_dir, '.lock')):
+            self._write_json_file(os.path.join(query_dir, 'query_details.json'), query_record.model_dump(mode='json'))
 
-    def save_dataset(self, abstracts_data: List[ScientificAbstract], user_query: str) -> str:
+    def save_dataset(self, abstracts_data: List[ScientificAbstract], user_query: str, search_query: Optional[str] = None) -> str:
         """ 
         Save abstract dataset and query metadata to local storage, rebuild index, and return query ID.
         """
         query_id = None
         try:
-            query_id = self.get_new_query_id()
+            # Chỉ cấp phát ID và cập nhật index cần khóa, việc ghi dữ liệu chạy song song
+            query_id = self._allocate_query_id()
             user_query_details = UserQueryRecord(
                 user_query_id=query_id, 
-                user_query=user_query
+                user_query=user_query,
+                search_query=search_query,
+                last_fetched_at=datetime.now(),
             )
-
-            # Tạo thư mục cho query mới
             query_dir = os.path.join(self.storage_folder_path, query_id)
-            os.makedirs(query_dir, exist_ok=True)
-            
-            # Chuyển đổi authors từ list thành string trước khi lưu
-            list_of_abstracts = []
-            for model in abstracts_data:
-                abstract_dict = model.model_dump()
-                if isinstance(abstract_dict.get("authors"), list):
-                    abstract_dict["authors"] = ", ".join(abstract_dict["authors"])
-                list_of_abstracts.append(abstract_dict)
             
             # Lưu danh sách abstract
-            abstracts_path = os.path.join(query_dir, "abstracts.json")
-            with open(abstracts_path, "w", encoding='utf-8') as file:
-                json.dump(list_of_abstracts, file, indent=4, ensure_ascii=False)
+            abstracts_path = os.path.join(query_dir, DATASET_FILE_NAMES[self.storage_format])
+            self._write_dataset_file(abstracts_path, self._to_records(abstracts_data))
 
-            # Lưu chi tiết query
+            # Lưu chi tiết query, ghi sau cùng: query chỉ hoàn chỉnh khi file này tồn tại
             query_details_path = os.path.join(query_dir, "query_details.json")
-            with open(query_details_path, "w", encoding='utf-8') as file:
-                # Sử dụng ensure_ascii=False để bảo toàn ký tự Unicode
-                # Chuyển model_dump_json thành dict trước, rồi sau đó dump
-                json_dict = user_query_details.model_dump()
-                json.dump(json_dict, file, indent=4, ensure_ascii=False)
+            self._write_json_file(query_details_path, user_query_details.model_dump(mode='json'))
 
             self.logger.info(f"Data for query ID {query_id} saved successfully.")
-            self._rebuild_index()  # Rebuild index after saving new data
+            self._update_index(add={query_id: user_query})
 
             return query_id
 
@@ -127,19 +349,88 @@ class LocalJSONStore(UserQueryDataStore):
         if os.path.exists(path_to_data):
             shutil.rmtree(path_to_data)
             self.logger.info(f"Directory '{path_to_data}' has been deleted.")
-            self._rebuild_index()  # Rebuild index after deleting data
+            self._update_index(remove=[query_id])
         else:
             self.logger.warning(f"Directory '{path_to_data}' does not exist and cannot be deleted.")
 
+    def list_dataset_ids(self) -> List[str]:
+        """
+        List query_X folders in storage, including ones without query details (e.g. left over by a failed save).
+        """
+        return [
+            name for name in os.listdir(self.storage_folder_path)
+            if os.path.isdir(os.path.join(self.storage_folder_path, name)) and re.match(r'query_\d+', name)
+        ]
+
+    def record_access(self, query_id: str) -> None:
+        """
+        Store the last access time as the modification time of a marker file in the query folder.
+        """
+        query_dir = os.path.join(self.storage_folder_path, query_id)
+        if not os.path.isdir(query_dir):
+            return
+        access_path = os.path.join(query_dir, LAST_ACCESS_FILE_NAME)
+        try:
+            os.utime(access_path)
+        except FileNotFoundError:
+            open(access_path, 'a').close()
+
+    def get_last_access(self, query_id: str) -> float:
+        """
+        Last access time of a query, falling back to the modification time of its folder if it was never accessed.
+        """
+        query_dir = os.path.join(self.storage_folder_path, query_id)
+        access_path = os.path.join(query_dir, LAST_ACCESS_FILE_NAME)
+        if os.path.exists(access_path):
+            return os.path.getmtime(access_path)
+        return os.path.getmtime(query_dir)
+
+    def get_dataset_size(self, query_id: str) -> int:
+        """
+        Total size of the files in the query folder, in bytes.
+        """
+        query_dir = os.path.join(self.storage_folder_path, query_id)
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(query_dir)
+            for name in files
+        )
+
     def get_list_of_queries(self) -> Dict[str, str]:
         """ 
         Get a dictionary containing query ID (as a key) and original user query (as a value) from the index. 
+        The index is reloaded when another process has updated it.
         """
+        try:
+            index_mtime = os.path.getmtime(self.index_file_path)
+            if index_mtime != self._index_mtime:
+                with open(self.index_file_path, 'r', encoding='utf-8') as file:
+                    self.metadata_index = json.load(file)
+                self._index_mtime = index_mtime
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            self.logger.warning(f"Could not reload index, using the cached one: {e}")
         return self.metadata_index
 
+    def _update_index(self, add: Dict[str, str] = None, remove: List[str] = ()) -> None:
+        """
+        Apply changes to index.json under the index lock, starting from its current content on disk.
+        """
+        with self.index_lock:
+            try:
+                with open(self.index_file_path, 'r', encoding='utf-8') as file:
+                    index = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                index = self._rebuild_index()
+            index.update(add or {})
+            for query_id in remove:
+                index.pop(query_id, None)
+            self._write_json_file(self.index_file_path, index)
+            self.metadata_index = index
+
     def _rebuild_index(self) -> Dict[str, str]:
         """ 
         Rebuild the index from all query details files, to serve for a lookup purposes.
+        Callers must hold the index lock.
         """
         index = {}
         
@@ -151,9 +442,7 @@ class LocalJSONStore(UserQueryDataStore):
             
         try:
             # Lọc các thư mục khớp với mẫu query_X
-            subdirs = [name for name in os.listdir(self.storage_folder_path) 
-                      if os.path.isdir(os.path.join(self.storage_folder_path, name)) 
-                      and re.match(r'query_\d+', name)]
+            subdirs = self.list_dataset_ids()
             
             query_data_paths = [os.path.join(self.storage_folder_path, name) for name in subdirs]
             
@@ -174,8 +463,7 @@ class LocalJSONStore(UserQueryDataStore):
                     self.logger.warning(f"No query_details.json file found in {query_data_path}")
             
             # Lưu index đã cập nhật
-            with open(self.index_file_path, 'w', encoding='utf-8') as file:
-                json.dump(index, file, indent=4, ensure_ascii=False)
+            self._write_json_file(self.index_file_path, index)
                 
         except Exception as e:
             self.logger.error(f"Error rebuilding index: {e}")
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel
 
@@ -8,7 +9,10 @@ class ScientificAbstract(BaseModel):
     authors: Optional[str]
     year: Optional[int]
     abstract_content: str
+    pmid: Optional[str] = None
     
 class UserQueryRecord(BaseModel):
     user_query_id: str
-    user_query: str
\ No newline at end of file
+    user_query: str
+    search_query: Optional[str] = None
+    last_fetched_at: Optional[datetime] = None
\ No newline at end of file
@@ -0,0 +1,131 @@
+from typing import Iterator, List, Optional, Tuple
+from langchain.vectorstores import VectorStore
+from langchain_core.documents.base import Document
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables.base import Runnable
+from backend.data.interface import UserQueryDataStore
+from backend.data.lifecycle import StorageLifecycleManager
+from backend.pipeline.local_first import CorpusIndex
+from backend.pipeline.progressive import ProgressiveIngestor
+from backend.rag_pipeline.interface import RagWorkflow
+from backend.utils.single_flight import SingleFlight
+from backend.utils.text import normalize_question
+import logging
+
+
+class AnswerPipeline:
+    """
+    Answer scientific questions from stored abstracts: reuse the vector index of a question asked before,
+    or ingest abstracts for a new one, retrieve the most similar abstracts and let the LLM answer from them.
+    Shared by the Streamlit app and the HTTP API.
+    """
+
+    def __init__(
+        self,
+        data_store: UserQueryDataStore,
+        rag_workflow: RagWorkflow,
+        ingestor: ProgressiveIngestor,
+        llm: Runnable,
+        prompt: ChatPromptTemplate,
+        lifecycle_manager: Optional[StorageLifecycleManager] = None,
+        cut_off: int = 5,
+        corpus: Optional[CorpusIndex] = None,
+        top_up: bool = True,
+    ):
+        """
+        Args:
+        - data_store (UserQueryDataStore): Store holding the datasets.
+        - rag_workflow (RagWorkflow): Workflow holding the vector indexes.
+        - ingestor (ProgressiveIngestor): Ingestor used for new questions.
+        - llm (Runnable): The language model runnable.
+        - prompt (ChatPromptTemplate): Question answering prompt, with `question` and `retrieved_abstracts` inputs.
+        - lifecycle_manager (StorageLifecycleManager): If given, accesses are recorded and storage is evicted in the background after ingests.
+        - cut_off (int): Number of abstracts passed to the LLM.
+        - corpus (CorpusIndex): If given, new questions the stored corpus covers well enough are answered from
+          the stored abstracts without waiting for PubMed.
+        - top_up (bool): Whether questions answered from the corpus are topped up from PubMed in the background.
+        """
+        self.data_store = data_store
+        self.rag_workflow = rag_workflow
+        self.ingestor = ingestor
+        self.chain = prompt | llm
+        self.lifecycle_manager = lifecycle_manager
+        self.cut_off = cut_off
+        self.corpus = corpus
+        self.top_up = top_up
+        # Identical new questions asked at the same time are ingested once
+        self.question_flight = SingleFlight("question")
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def find_existing_query(self, scientist_question: str) -> Optional[str]:
+        """
+        ID of a stored query with the same question (ignoring case and whitespace), if any.
+        """
+        normalized_query = normalize_question(scientist_question)
+        query_list = self.data_store.get_list_of_queries()
+        return next(
+            (query_id for query_id, query_text in query_list.items() if normalize_question(query_text) == normalized_query),
+            None
+        )
+
+    def get_vector_index(self, scientist_question: str) -> Tuple[Optional[str], Optional[VectorStore], bool]:
+        """
+        Vector index to answer a question from, ingesting abstracts if the question is new.
+        Returns (query ID, vector index, whether the question was new); the ID and index are None
+        when no abstracts were found. Callers asking the same question while it is being ingested wait for
+        that ingest and share its result.
+        """
+        return self.question_flight.do(normalize_question(scientist_question), self._get_vector_index, scientist_question)
+
+    def _get_vector_index(self, scientist_question: str) -> Tuple[Optional[str], Optional[VectorStore], bool]:
+        existing_query_id = self.find_existing_query(scientist_question)
+        if existing_query_id:
+            if self.lifecycle_manager:
+                self.lifecycle_manager.record_access(existing_query_id)
+            return existing_query_id, self.rag_workflow.get_vector_index_by_user_query(existing_query_id), False
+
+        query_id = self._create_query_from_corpus(scientist_question) if self.corpus else None
+        # Save and index the first batch of abstracts, the rest is fetched in the background
+        query_id = query_id or self.ingestor.ingest(scientist_question)
+        if self.corpus:
+            self.corpus.sync_in_background()
+        if query_id is None:
+            return None, None, True
+        vector_index = self.rag_workflow.get_vector_index_by_user_query(query_id)
+        # Keep storage within the configured budget / TTL
+        if self.lifecycle_manager:
+            self.lifecycle_manager.evict_in_background(query_id)
+        return query_id, vector_index, True
+
+    def _create_query_from_corpus(self, scientist_question: str) -> Optional[str]:
+        """
+        Create the query from stored abstracts if the corpus covers the question, skipping the PubMed search.
+        """
+        try:
+            coverage = self.corpus.coverage(scientist_question)
+        except Exception as e:
+            self.logger.error(f'Corpus coverage check failed, falling back to PubMed: {e}')
+            return None
+        if not coverage.sufficient:
+            return None
+
+        query_id = self.data_store.save_dataset(coverage.abstracts, scientist_question)
+        self.rag_workflow.create_vector_index_for_user_query(self.data_store.create_document_list(coverage.abstracts), query_id)
+        self.logger.info(f'Answering {query_id} from {len(coverage.abstracts)} stored abstracts.')
+        if self.top_up:
+            self.ingestor.top_up(query_id, scientist_question, coverage.abstracts)
+        return query_id
+
+    def retrieve_documents(self, vector_index: VectorStore, scientist_question: str) -> List[Document]:
+        return vector_index.similarity_search(scientist_question)[:self.cut_off]
+
+    def stream_answer(self, scientist_question: str, documents: List[Document]) -> Iterator[str]:
+        """
+        Stream the LLM answer to a question from the retrieved documents.
+        """
+        for chunk in self.chain.stream({"question": scientist_question, "retrieved_abstracts": documents}):
+            yield chunk.content
+
+    def answer(self, scientist_question: str, documents: List[Document]) -> str:
+        return self.chain.invoke({"question": scientist_question, "retrieved_abstracts": documents}).content
\ No newline at end of file
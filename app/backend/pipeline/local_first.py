@@ -0,0 +1,228 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+from pydantic import BaseModel
+from langchain_core.documents.base import Document
+from backend.data.file_utils import FileLock, atomic_write
+from backend.data.interface import UserQueryDataStore
+from backend.data.models import ScientificAbstract
+from backend.rag_pipeline.interface import RagWorkflow
+from backend.retriever.composite import abstract_keys
+import logging
+
+
+CORPUS_INDEX_ID = "corpus"
+
+
+class CorpusCoverage(BaseModel):
+    """ How well the stored corpus covers a question. """
+    top_similarity: float = 0.0
+    mean_similarity: float = 0.0
+    supporting_abstracts: int = 0
+    sufficient: bool = False
+    abstracts: List[ScientificAbstract] = []
+
+
+class CorpusIndex:
+    """
+    One vector index over every abstract stored for any query, de-duplicated by PMID, DOI or title, used to
+    check whether the stored corpus already covers a new question before PubMed is called.
+    The index is kept in sync with the data store incrementally (only datasets whose size changed are read),
+    in the background so that embedding new abstracts never delays an answer. Every abstract records the
+    datasets it was stored for: once they are all deleted or evicted, the abstract is removed from the index.
+    """
+
+    def __init__(
+        self,
+        data_store: UserQueryDataStore,
+        rag_workflow: RagWorkflow,
+        state_path: str,
+        top_k: int = 10,
+        min_similarity: float = 0.75,
+        min_abstracts: int = 5,
+    ):
+        """
+        Args:
+        - data_store (UserQueryDataStore): Store holding the datasets of all queries.
+        - rag_workflow (RagWorkflow): Workflow holding the corpus index. Its relevance scores are compared
+          to `min_similarity`; QuantizedRag scores are cosine similarities.
+        - state_path (str): JSON file recording which datasets and abstracts are indexed.
+        - top_k (int): Number of abstracts retrieved for the coverage check.
+        - min_similarity (float): Relevance score from which an abstract supports the question.
+        - min_abstracts (int): Number of supporting abstracts needed to answer from the corpus.
+        """
+        self.data_store = data_store
+        self.rag_workflow = rag_workflow
+        self.state_path = state_path
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+        self.min_abstracts = min_abstracts
+        self.state_lock = FileLock(f'{state_path}.lock')
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="corpus-sync")
+        self._sync_task: Optional[Future] = None
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    @staticmethod
+    def _empty_state() -> Dict:
+        # datasets: indexed size per query ID, owners: query IDs per corpus key, keys: corpus key per abstract key
+        return {"datasets": {}, "owners": {}, "keys": {}, "indexed": False}
+
+    def _read_state(self) -> Dict:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return self._empty_state()
+
+    def _write_state(self, state: Dict) -> None:
+        with atomic_write(self.state_path) as file:
+            json.dump(state, file)
+
+    @staticmethod
+    def _keys(abstract: ScientificAbstract) -> List[str]:
+        return abstract_keys(abstract) or ["text:" + hashlib.sha1(abstract.abstract_content.encode("utf-8")).hexdigest()]
+
+    @staticmethod
+    def _to_document(abstract: ScientificAbstract, corpus_key: str) -> Document:
+        metadata = {"corpus_key": corpus_key, "title": abstract.title, "authors": abstract.authors, "year": abstract.year}
+        metadata.update({key: value for key, value in (("source", abstract.doi), ("pmid", abstract.pmid)) if value})
+        return Document(page_content=abstract.abstract_content, metadata=metadata)
+
+    @staticmethod
+    def _to_abstract(document: Document) -> ScientificAbstract:
+        return ScientificAbstract(
+            title=document.metadata.get("title"),
+            authors=document.metadata.get("authors"),
+            year=document.metadata.get("year"),
+            doi=document.metadata.get("source"),
+            pmid=document.metadata.get("pmid"),
+            abstract_content=document.page_content,
+        )
+
+    def _changes(self, state: Dict) -> Tuple[List[Document], Set[str]]:
+        """
+        Update the state with the live datasets. Returns the documents to add and the corpus keys of abstracts
+        no dataset holds any more.
+        """
+        live_ids = self.data_store.list_dataset_ids()
+        new_documents = []
+        for query_id in live_ids:
+            try:
+                size = self.data_store.get_dataset_size(query_id)
+                if state["datasets"].get(query_id) == size:
+                    continue
+                abstracts = self.data_store.read_dataset(query_id)
+            except FileNotFoundError:
+                continue  # Deleted (or not saved yet) meanwhile
+            for abstract in abstracts:
+                keys = self._keys(abstract)
+                corpus_key = next((state["keys"][key] for key in keys if key in state["keys"]), None)
+                if corpus_key is None:
+                    corpus_key = keys[0]
+                    new_documents.append(self._to_document(abstract, corpus_key))
+                for key in keys:
+                    state["keys"].setdefault(key, corpus_key)
+                owners = state["owners"].setdefault(corpus_key, [])
+                if query_id not in owners:
+                    owners.append(query_id)
+            state["datasets"][query_id] = size
+
+        deleted_ids = set(state["datasets"]) - set(live_ids)
+        for query_id in deleted_ids:
+            del state["datasets"][query_id]
+        orphaned = set()
+        if deleted_ids:
+            for corpus_key, owners in list(state["owners"].items()):
+                owners[:] = [query_id for query_id in owners if query_id not in deleted_ids]
+                if not owners:
+                    orphaned.add(corpus_key)
+                    del state["owners"][corpus_key]
+            state["keys"] = {key: corpus_key for key, corpus_key in state["keys"].items() if corpus_key not in orphaned}
+        return new_documents, orphaned
+
+    def sync(self) -> int:
+        """
+        Add the abstracts of new or grown datasets to the corpus index and remove those of deleted datasets.
+        Returns the number of abstracts added.
+        """
+        with self.state_lock:
+            state = self._read_state()
+            if "owners" not in state:
+                # Corpus built before abstracts recorded their datasets: rebuild it
+                self.rag_workflow.delete_vector_index(CORPUS_INDEX_ID)
+                state = self._empty_state()
+            new_documents, orphaned = self._changes(state)
+            can_remove = hasattr(self.rag_workflow, "remove_documents_from_vector_index")
+            if orphaned and state["indexed"] and not can_remove:
+                # The backend cannot remove single documents: rebuild from the live datasets
+                self.rag_workflow.delete_vector_index(CORPUS_INDEX_ID)
+                state = self._empty_state()
+                new_documents, orphaned = self._changes(state)
+
+            if orphaned and state["indexed"]:
+                removed = self.rag_workflow.remove_documents_from_vector_index(
+                    CORPUS_INDEX_ID, lambda metadata: metadata.get("corpus_key") in orphaned
+                )
+                self.logger.info(f'Removed {removed} abstracts of deleted queries from the corpus index.')
+            if new_documents:
+                if state["indexed"]:
+                    self.rag_workflow.add_documents_to_vector_index(new_documents, CORPUS_INDEX_ID)
+                else:
+                    self.rag_workflow.create_vector_index_for_user_query(new_documents, CORPUS_INDEX_ID)
+                    state["indexed"] = True
+                self.logger.info(f'Added {len(new_documents)} abstracts to the corpus index.')
+            self._write_state(state)
+            return len(new_documents)
+
+    def sync_in_background(self) -> None:
+        """
+        Start a sync unless one is already running.
+        """
+        with self._lock:
+            if self._sync_task is None or self._sync_task.done():
+                self._sync_task = self.executor.submit(self._sync_logged)
+
+    def _sync_logged(self) -> int:
+        try:
+            return self.sync()
+        except Exception as e:
+            self.logger.error(f'Syncing the corpus index failed: {e}')
+            return 0
+
+    def coverage(self, scientist_question: str) -> CorpusCoverage:
+        """
+        Score how well the stored corpus covers a question: similarity of the best abstracts and the number
+        of abstracts above `min_similarity`. The coverage is sufficient with `min_abstracts` such abstracts.
+        """
+        state = self._read_state()
+        if not state.get("indexed"):
+            return CorpusCoverage()
+        vector_index = self.rag_workflow.get_vector_index_by_user_query(CORPUS_INDEX_ID)
+        hits = vector_index.similarity_search_with_relevance_scores(scientist_question, k=self.top_k)
+        # Abstracts of queries deleted since the last sync must not answer
+        live_ids = set(self.data_store.list_dataset_ids())
+        owners = state.get("owners", {})
+        hits = [
+            (document, score) for document, score in hits
+            if live_ids.intersection(owners.get(document.metadata.get("corpus_key"), []))
+        ]
+        if not hits:
+            return CorpusCoverage()
+        scores = [score for _, score in hits]
+        supporting = [document for document, score in hits if score >= self.min_similarity]
+        coverage = CorpusCoverage(
+            top_similarity=max(scores),
+            mean_similarity=sum(scores) / len(scores),
+            supporting_abstracts=len(supporting),
+            sufficient=len(supporting) >= self.min_abstracts,
+            abstracts=[self._to_abstract(document) for document in supporting],
+        )
+        self.logger.info(
+            f'Corpus coverage: top {coverage.top_similarity:.3f}, mean {coverage.mean_similarity:.3f}, '
+            f'{coverage.supporting_abstracts} abstracts above {self.min_similarity}.'
+        )
+        return coverage
\ No newline at end of file
@@ -0,0 +1,158 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+from backend.data.interface import UserQueryDataStore
+from backend.data.models import ScientificAbstract
+from backend.rag_pipeline.interface import RagWorkflow
+from backend.retriever.composite import abstract_keys
+from backend.retriever.interface import AbstractRetriever
+from backend.retriever.pubmed_retriever import PubMedAbstractRetriever
+import logging
+
+
+class ProgressiveIngestor:
+    """
+    Ingest a new question progressively: the first batch of abstracts is stored and indexed right away
+    so the question can be answered, further batches are fetched in the background and appended
+    to the same dataset and vector index until `max_abstracts` PMIDs have been processed.
+    """
+
+    def __init__(
+        self,
+        retriever: PubMedAbstractRetriever,
+        data_store: UserQueryDataStore,
+        rag_workflow: RagWorkflow,
+        first_batch_size: int = 10,
+        batch_size: int = 10,
+        max_abstracts: int = 50,
+        max_workers: int = 2,
+        fast_retriever: Optional[AbstractRetriever] = None,
+    ):
+        """
+        Args:
+        - retriever (PubMedAbstractRetriever): Retriever used to search and fetch abstracts in batches.
+        - data_store (UserQueryDataStore): Store the abstracts are saved to.
+        - rag_workflow (RagWorkflow): Workflow holding the vector index of the query.
+        - first_batch_size (int): Number of PMIDs fetched before the first answer.
+        - batch_size (int): Number of PMIDs fetched per background batch.
+        - max_abstracts (int): Maximum number of PMIDs processed per question.
+        - max_workers (int): Number of questions topped up in the background at the same time.
+        - fast_retriever (AbstractRetriever): If given, the first batch is taken from this retriever
+          (e.g. a CompositeAbstractRetriever with deadlines) called with the simplified search query,
+          and the background batches from `retriever` skip abstracts already in it.
+        """
+        self.retriever = retriever
+        self.data_store = data_store
+        self.rag_workflow = rag_workflow
+        self.first_batch_size = first_batch_size
+        self.batch_size = batch_size
+        self.max_abstracts = max_abstracts
+        self.fast_retriever = fast_retriever
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="progressive-ingest")
+        self.background_tasks: Dict[str, Future] = {}
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def ingest(self, scientist_question: str) -> Optional[str]:
+        """
+        Fetch, store and index the first non-empty batch of abstracts and schedule the rest in the background.
+        Returns the new query ID, or None when no abstracts were found.
+        """
+        search_query = self.retriever.build_search_query(scientist_question)
+        batches = self.retriever.iter_abstract_batches(
+            search_query,
+            first_batch_size=self.batch_size if self.fast_retriever is not None else self.first_batch_size,
+            batch_size=self.batch_size,
+            max_abstracts=self.max_abstracts,
+            simplify_query=False,
+        )
+        first_batch = None
+        if self.fast_retriever is not None:
+            first_batch = self.fast_retriever.get_abstract_data(search_query)
+            batches = self._skip_known(batches, first_batch)
+        first_batch = first_batch or next((batch for batch in batches if batch), None)
+        if first_batch is None:
+            return None
+
+        query_id = self.data_store.save_dataset(first_batch, scientist_question, search_query=search_query)
+        documents = self.data_store.create_document_list(first_batch)
+        self.rag_workflow.create_vector_index_for_user_query(documents, query_id)
+        self.background_tasks[query_id] = self.executor.submit(self._ingest_remaining, query_id, batches)
+        return query_id
+
+    def top_up(self, query_id: str, scientist_question: str, known_abstracts: List[ScientificAbstract]) -> None:
+        """
+        Fetch abstracts from PubMed in the background for a query that was created from already stored abstracts,
+        skipping those.
+        """
+        batches = self._top_up_batches(query_id, scientist_question, known_abstracts)
+        self.background_tasks[query_id] = self.executor.submit(self._ingest_remaining, query_id, batches)
+
+    def _top_up_batches(
+        self, query_id: str, scientist_question: str, known_abstracts: List[ScientificAbstract]
+    ) -> Iterator[List[ScientificAbstract]]:
+        # Simplifying the question is an LLM call, done here in the background as well
+        search_query = self.retriever.build_search_query(scientist_question)
+        record = self.data_store.get_query_record(query_id)
+        record.search_query = search_query
+        self.data_store.update_query_record(record)
+        batches = self.retriever.iter_abstract_batches(
+            search_query,
+            first_batch_size=self.batch_size,
+            batch_size=self.batch_size,
+            max_abstracts=self.max_abstracts,
+            simplify_query=False,
+        )
+        yield from self._skip_known(batches, known_abstracts)
+
+    def is_running(self, query_id: str) -> bool:
+        """
+        Whether abstracts are still being added to the query in the background.
+        """
+        task = self.background_tasks.get(query_id)
+        return task is not None and not task.done()
+
+    def add_abstracts(self, query_id: str, abstracts: List[ScientificAbstract]) -> int:
+        """
+        Append the abstracts not stored yet to the dataset of a query and embed only them into its vector index.
+        Returns the number of abstracts added.
+        """
+        # Refreshes, also from other processes, append to the same query: check the stored abstracts under their lock
+        with self.data_store.query_update_lock(query_id):
+            known_ids = {
+                value for abstract in self.data_store.read_dataset(query_id)
+                for value in (abstract.pmid, abstract.doi) if value
+            }
+            new_abstracts = [
+                abstract for abstract in abstracts
+                if not known_ids.intersection(filter(None, (abstract.pmid, abstract.doi)))
+            ]
+            if new_abstracts:
+                self.data_store.append_to_dataset(query_id, new_abstracts)
+                documents = self.data_store.create_document_list(new_abstracts)
+                self.rag_workflow.add_documents_to_vector_index(documents, query_id)
+        return len(new_abstracts)
+
+    @staticmethod
+    def _skip_known(
+        batches: Iterator[List[ScientificAbstract]], known_abstracts: List[ScientificAbstract]
+    ) -> Iterator[List[ScientificAbstract]]:
+        known_keys = {key for abstract in known_abstracts for key in abstract_keys(abstract)}
+        for batch in batches:
+            yield [abstract for abstract in batch if not known_keys.intersection(abstract_keys(abstract))]
+
+    def _ingest_remaining(self, query_id: str, batches: Iterator[List[ScientificAbstract]]) -> int:
+        total = 0
+        try:
+            for batch in batches:
+                if not batch:
+                    continue
+                added = self.add_abstracts(query_id, batch)
+                total += added
+                self.logger.info(f'Added {added} abstracts to {query_id} in the background ({total} so far).')
+        except FileNotFoundError:
+            self.logger.warning(f'Query {query_id} was deleted, stopping background ingestion.')
+        except Exception as e:
+            self.logger.error(f'Background ingestion for query {query_id} failed after {total} abstracts: {e}')
+        finally:
+            self.background_tasks.pop(query_id, None)
+        return total
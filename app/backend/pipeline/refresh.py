@@ -0,0 +1,161 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from backend.data.interface import UserQueryDataStore
+from backend.pipeline.progressive import ProgressiveIngestor
+from backend.rag_pipeline.interface import RagWorkflow
+from backend.retriever.pubmed_retriever import PubMedAbstractRetriever
+import logging
+
+
+class QueryRefresher:
+    """
+    Refresh a stored query incrementally: search PubMed only for publications since the last fetch,
+    fetch the PMIDs that are not stored yet, and append them to the dataset and the vector index.
+    """
+
+    def __init__(
+        self,
+        retriever: PubMedAbstractRetriever,
+        data_store: UserQueryDataStore,
+        rag_workflow: RagWorkflow,
+        max_new_abstracts: int = 20,
+        ingestor: Optional[ProgressiveIngestor] = None,
+    ):
+        """
+        Args:
+        - retriever (PubMedAbstractRetriever): Retriever used for the delta search.
+        - data_store (UserQueryDataStore): Store holding the datasets.
+        - rag_workflow (RagWorkflow): Workflow holding the vector indexes.
+        - max_new_abstracts (int): Maximum number of new abstracts added per refresh.
+        - ingestor (ProgressiveIngestor): If given, queries still being ingested in the background are skipped.
+        """
+        self.retriever = retriever
+        self.data_store = data_store
+        self.rag_workflow = rag_workflow
+        self.max_new_abstracts = max_new_abstracts
+        self.ingestor = ingestor
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def _known_ids(self, query_id: str) -> set:
+        known = set()
+        for abstract in self.data_store.read_dataset(query_id):
+            if abstract.pmid:
+                known.add(abstract.pmid)
+            if abstract.doi:
+                known.add(abstract.doi)
+        return known
+
+    def refresh(self, query_id: str) -> int:
+        """
+        Add abstracts published since the last fetch of a query. Returns the number of abstracts added.
+        """
+        with self._lock:
+            if query_id in self._refreshing or (self.ingestor and self.ingestor.is_running(query_id)):
+                self.logger.info(f'Query {query_id} is already being updated, skipping refresh.')
+                return 0
+            self._refreshing.add(query_id)
+        try:
+            record = self.data_store.get_query_record(query_id)
+            started_at = datetime.now()
+            # Queries saved before search queries were recorded are simplified again once
+            search_query = record.search_query or self.retriever.build_search_query(record.user_query)
+            # One day of overlap, already stored PMIDs are filtered out
+            since = (record.last_fetched_at or started_at - timedelta(days=365)).date() - timedelta(days=1)
+
+            # The delta search is slow, run it before taking the lock
+            known_ids = self._known_ids(query_id)
+            candidates = self.retriever.get_new_abstract_data(
+                search_query, since, known_pmids=known_ids, max_abstracts=self.max_new_abstracts
+            )
+            # Other processes (each runs its own scheduler) may refresh the same query: check the stored
+            # abstracts again under the lock so that the same PMIDs are never appended twice
+            with self.data_store.query_update_lock(query_id):
+                known_ids = self._known_ids(query_id)
+                new_abstracts = [
+                    abstract for abstract in candidates
+                    if not known_ids.intersection(filter(None, (abstract.pmid, abstract.doi)))
+                ]
+                if new_abstracts:
+                    self.data_store.append_to_dataset(query_id, new_abstracts)
+                    documents = self.data_store.create_document_list(new_abstracts)
+                    self.rag_workflow.add_documents_to_vector_index(documents, query_id)
+
+                record = self.data_store.get_query_record(query_id)
+                record.search_query = search_query
+                record.last_fetched_at = max(started_at, record.last_fetched_at or started_at)
+                self.data_store.update_query_record(record)
+            self.logger.info(f'Refreshed query {query_id}: {len(new_abstracts)} new abstracts since {since}.')
+            return len(new_abstracts)
+        finally:
+            with self._lock:
+                self._refreshing.discard(query_id)
+
+
+class RefreshScheduler:
+    """
+    Background thread that periodically refreshes the most recently accessed ("hot") queries
+    whose last fetch is older than `min_refresh_age_seconds`.
+    """
+
+    def __init__(
+        self,
+        refresher: QueryRefresher,
+        interval_seconds: float = 3600,
+        hot_queries: int = 5,
+        min_refresh_age_seconds: float = 86400,
+    ):
+        self.refresher = refresher
+        self.data_store = refresher.data_store
+        self.interval_seconds = interval_seconds
+        self.hot_queries = hot_queries
+        self.min_refresh_age_seconds = min_refresh_age_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def select_queries(self) -> List[str]:
+        """
+        Most recently accessed queries that are due for a refresh.
+        """
+        query_ids = sorted(self.data_store.get_list_of_queries(), key=self.data_store.get_last_access, reverse=True)
+        due = []
+        for query_id in query_ids[:self.hot_queries]:
+            last_fetched_at = self.data_store.get_query_record(query_id).last_fetched_at
+            if last_fetched_at is None or (datetime.now() - last_fetched_at).total_seconds() > self.min_refresh_age_seconds:
+                due.append(query_id)
+        return due
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        Refresh all due hot queries once. Returns the number of new abstracts per query.
+        """
+        results = {}
+        for query_id in self.select_queries():
+            try:
+                results[query_id] = self.refresher.refresh(query_id)
+            except Exception as e:
+                self.logger.error(f'Scheduled refresh of query {query_id} failed: {e}')
+        return results
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="query-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            started = time.perf_counter()
+            results = self.run_once()
+            if results:
+                self.logger.info(f'Refreshed {len(results)} hot queries in {time.perf_counter() - started:.1f}s: {results}')
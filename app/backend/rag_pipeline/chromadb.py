@@ -1,21 +1,48 @@
-from typing import List
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from typing import Callable, Dict, List, Optional, Set
 import chromadb
 from langchain.vectorstores import VectorStore
 from langchain_community.vectorstores import Chroma
 from langchain_core.embeddings import Embeddings
 from langchain_core.documents.base import Document
-from backend.rag_pipeline.interface import RagWorkflow
+from backend.rag_pipeline.interface import (
+    EMBEDDING_METADATA_KEYS, INTERNAL_COLLECTION_SEPARATOR, RagWorkflow, get_embedding_metadata, is_compatible
+)
+from backend.data.file_utils import FileLock
 import logging
 
 
+# A reader may look a collection up while a migration swaps it, wait that long for it to reappear
+SWAP_WAIT_SECONDS = 0.5
+
+
 class ChromaDbRag(RagWorkflow):
     """ 
     Simple RAG workflow with Chroma as vector store 
     """
 
-    def __init__(self, persist_directory: str, embeddings: Embeddings):
+    def __init__(
+        self,
+        persist_directory: str,
+        embeddings: Embeddings,
+        embeddings_factory: Optional[Callable[[str], Embeddings]] = None,
+    ):
+        """
+        Args:
+        - persist_directory (str): Folder of the persistent Chroma client.
+        - embeddings (Embeddings): Embedding model for new collections and queries.
+        - embeddings_factory (Callable[[str], Embeddings]): Creates an embedding model from a model name. If given,
+          collections built with another model keep being served with their own model until they are migrated,
+          otherwise opening them raises EmbeddingModelMismatchError.
+        """
         self.persist_directory = persist_directory
         self.embeddings = embeddings
+        self.embeddings_factory = embeddings_factory
         self.client = self._create_chromadb_client()
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.INFO)
@@ -23,18 +50,38 @@ class ChromaDbRag(RagWorkflow):
     def _create_chromadb_client(self):
         return chromadb.PersistentClient(path=self.persist_directory)
     
+    def _collection_lock(self, query_id: str) -> FileLock:
+        """
+        Inter-process lock serializing writes to the collection of a query (additions and migration). Lock files
+        sit next to the Chroma files; they are files, so compaction (which removes folders) leaves them alone.
+        """
+        return FileLock(os.path.join(self.persist_directory, f'.{query_id}.lock'))
+
+    def _storage_lock(self, shared: bool = True) -> FileLock:
+        """
+        Inter-process lock over the segment folders: writers, which may create folders, hold it shared,
+        compaction holds it exclusively so that it never sees a folder whose segment is being registered.
+        """
+        return FileLock(os.path.join(self.persist_directory, '.storage.lock'), shared=shared)
+
+    def _segment_ids(self) -> Set[str]:
+        with closing(sqlite3.connect(os.path.join(self.persist_directory, 'chroma.sqlite3'))) as connection:
+            return {row[0] for row in connection.execute('SELECT id FROM segments')}
+
     def create_vector_index_for_user_query(self, documents: List[Document], query_id: str) -> VectorStore:
         """
         Create Chroma vector index and set query ID as collection name.
         """
         self.logger.info(f'Creating vector index for {query_id}')
         try:
-            index = Chroma.from_documents(
-                documents, 
-                self.embeddings,
-                client=self.client, 
-                collection_name=query_id
-            )
+            with self._storage_lock():
+                index = Chroma.from_documents(
+                    documents, 
+                    self.embeddings,
+                    client=self.client, 
+                    collection_name=query_id,
+                    collection_metadata=get_embedding_metadata(self.embeddings) or None,
+                )
             return index
         except Exception as e:
             self.logger.error(f'There was an issue creating vector index for query: {query_id}. The issue: {e}')
@@ -46,12 +93,176 @@ class ChromaDbRag(RagWorkflow):
         """
         self.logger.info(f'Loading vector index for query: {query_id}')
         try:
+            # Opening a missing collection creates it empty: give a migration swapping it a moment to finish
+            deadline = time.monotonic() + SWAP_WAIT_SECONDS
+            while self._get_collection(query_id) is None and time.monotonic() < deadline:
+                time.sleep(0.05)
             index = Chroma(
                 client=self.client,
                 collection_name=query_id,
-                embedding_function=self.embeddings,
+                embedding_function=self._get_embeddings_for_index(query_id),
             )
             return index
         except Exception as e:
             self.logger.error(f'There was an issue retrieving vector index for query: {query_id}. The issue: {e}')
-            raise
\ No newline at end of file
+            raise
+    
+    def add_documents_to_vector_index(self, documents: List[Document], query_id: str) -> None:
+        """
+        Embed and append documents to the Chroma collection of the query ID.
+        """
+        self.logger.info(f'Adding {len(documents)} documents to vector index for {query_id}')
+        try:
+            with self._storage_lock(), self._collection_lock(query_id):
+                self.get_vector_index_by_user_query(query_id).add_documents(documents)
+        except Exception as e:
+            self.logger.error(f'There was an issue adding documents to vector index for query: {query_id}. The issue: {e}')
+            raise
+
+    def delete_vector_index(self, query_id: str) -> None:
+        """
+        Drop the Chroma collection named after the query ID, together with its internal collections.
+        """
+        internal_prefix = f'{query_id}{INTERNAL_COLLECTION_SEPARATOR}'
+        for collection in self.client.list_collections():
+            if collection.name.startswith(internal_prefix):
+                self.client.delete_collection(collection.name)
+        try:
+            self.client.delete_collection(query_id)
+            self.logger.info(f'Vector index for query {query_id} has been deleted.')
+        except ValueError:
+            self.logger.warning(f'Vector index for query {query_id} does not exist and cannot be deleted.')
+
+    def list_vector_indexes(self) -> List[str]:
+        """
+        List names of all Chroma collections.
+        """
+        return [
+            collection.name for collection in self.client.list_collections()
+            if INTERNAL_COLLECTION_SEPARATOR not in collection.name
+        ]
+
+    def _get_collection(self, name: str):
+        try:
+            return self.client.get_collection(name, embedding_function=None)
+        except ValueError:
+            return None
+
+    def get_index_metadata(self, query_id: str) -> Dict:
+        """
+        Embedding model metadata stored with the Chroma collection of the query ID.
+        """
+        collection = self._get_collection(query_id)
+        return dict(collection.metadata or {}) if collection is not None else {}
+
+    def get_index_size(self, query_id: str) -> int:
+        """
+        Size of the segment folders of the collection of a query and of its internal collections, in bytes.
+        Embeddings stored in chroma.sqlite3 are not counted: deleting a collection does not shrink that file.
+        """
+        try:
+            with sqlite3.connect(os.path.join(self.persist_directory, 'chroma.sqlite3')) as connection:
+                segment_ids = [row[0] for row in connection.execute(
+                    'SELECT segments.id FROM segments JOIN collections ON segments.collection = collections.id '
+                    'WHERE collections.name = ? OR collections.name LIKE ?',
+                    (query_id, f'{query_id}{INTERNAL_COLLECTION_SEPARATOR}%'),
+                )]
+        except sqlite3.Error as e:
+            self.logger.warning(f'Could not read Chroma segments of query {query_id}: {e}')
+            return 0
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for segment_id in segment_ids
+            for root, _, files in os.walk(os.path.join(self.persist_directory, segment_id))
+            for name in files
+        )
+
+    def list_shared_files(self) -> List[str]:
+        """
+        The Chroma SQLite database (with its journal files): it holds the embeddings of every collection and
+        deleting a collection does not shrink it.
+        """
+        database = os.path.join(self.persist_directory, 'chroma.sqlite3')
+        return [database, f'{database}-wal', f'{database}-shm', f'{database}-journal']
+
+    def migrate_vector_index(self, query_id: str, batch_size: int = 100) -> int:
+        """
+        Re-embed a collection with the configured embedding model. The new collection is built next to the old one,
+        which keeps serving queries, and replaces it once complete. Migrations of the same collection from several
+        processes are serialized; the later ones find it migrated and do nothing.
+        """
+        with self._storage_lock(), self._collection_lock(query_id):
+            source = self._get_collection(query_id)
+            if source is None:
+                raise ValueError(f'Vector index for query {query_id} does not exist.')
+            metadata, model_metadata = dict(source.metadata or {}), get_embedding_metadata(self.embeddings)
+            if any(key in metadata for key in EMBEDDING_METADATA_KEYS) and is_compatible(metadata, model_metadata):
+                self.logger.info(f'Vector index for query {query_id} is already migrated.')
+                return source.count()
+
+            # Collections left over by interrupted migrations of this query (none can be running, we hold the lock)
+            internal_prefix = f'{query_id}{INTERNAL_COLLECTION_SEPARATOR}'
+            for collection in self.client.list_collections():
+                if collection.name.startswith(internal_prefix):
+                    self.client.delete_collection(collection.name)
+            suffix = uuid.uuid4().hex[:8]
+            target = self.client.create_collection(
+                f'{internal_prefix}migrating_{suffix}', metadata=model_metadata or None, embedding_function=None
+            )
+
+            total, offset = source.count(), 0
+            while offset < total:
+                batch = source.get(include=['documents', 'metadatas'], limit=batch_size, offset=offset)
+                if not batch['ids']:
+                    break
+                vectors = self.embeddings.embed_documents(batch['documents'])
+                rows = list(zip(batch['ids'], vectors, batch['documents'], batch['metadatas']))
+                # Chroma rejects empty metadata, add rows without metadata separately
+                for with_metadata in (True, False):
+                    group = [row for row in rows if bool(row[3]) == with_metadata]
+                    if group:
+                        ids, embeddings, texts, metadatas = map(list, zip(*group))
+                        target.add(
+                            ids=ids, embeddings=embeddings, documents=texts,
+                            metadatas=metadatas if with_metadata else None,
+                        )
+                offset += len(batch['ids'])
+                self.logger.info(f'Migrated {offset}/{total} documents of {query_id}.')
+
+            # Swap by renaming, the old collection is only dropped once the new one is in place
+            old_name = f'{internal_prefix}old_{suffix}'
+            source.modify(name=old_name)
+            try:
+                target.modify(name=query_id)
+            except Exception:
+                # A reader opened the query in between and created an empty collection under its name
+                self.client.delete_collection(query_id)
+                target.modify(name=query_id)
+            self.client.delete_collection(old_name)
+            self.logger.info(f'Vector index for query {query_id} migrated to {model_metadata}.')
+            return offset
+
+    def compact(self) -> List[str]:
+        """
+        Remove segment folders that Chroma left on disk for collections that no longer exist.
+        Returns the removed folder names. Runs while no process writes to the store (see `_storage_lock`),
+        and every candidate is checked against the segments again right before it is removed.
+        """
+        removed = []
+        with self._storage_lock(shared=False):
+            try:
+                segment_ids = self._segment_ids()
+                candidates = [
+                    name for name in os.listdir(self.persist_directory)
+                    if os.path.isdir(os.path.join(self.persist_directory, name)) and name not in segment_ids
+                ]
+                for name in candidates:
+                    if name in self._segment_ids():
+                        continue
+                    path = os.path.join(self.persist_directory, name)
+                    shutil.rmtree(path)
+                    removed.append(name)
+                    self.logger.info(f'Removed unreferenced segment folder {path}.')
+            except sqlite3.Error as e:
+                self.logger.warning(f'Could not read Chroma segments, stopping compaction: {e}')
+        return removed
\ No newline at end of file
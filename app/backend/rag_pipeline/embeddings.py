@@ -1,17 +1,33 @@
 import os
-from typing import List, Union, Optional
+from typing import Dict, List, Tuple, Union, Optional
 import numpy as np
 from google import genai
 from google.genai import types
+from backend.utils.single_flight import SingleFlight
+
+
+# Output dimensions of known embedding models, so that they never need to be probed with an API call
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-004": 768,
+    "embedding-001": 768,
+    "text-multilingual-embedding-002": 768,
+    "gemini-embedding-001": 3072,
+    "gemini-embedding-exp-03-07": 3072,
+}
 
 
 class GeminiEmbeddingModel:
     """Wrapper for Google's Gemini embedding model."""
+
+    # Shared by all model instances: concurrent requests for the same texts are sent once
+    embedding_flight = SingleFlight("embedding")
     
     def __init__(
         self,
         api_key: Optional[str] = None,
         model_name: str = "text-embedding-004",
+        task_type: str = "RETRIEVAL-DOCUMENT",
+        batch_size: int = 100,
     ):
         """
         Initialize the Gemini embedding model.
@@ -19,12 +35,17 @@ class GeminiEmbeddingModel:
         Args:
             api_key: Google API key. If None, uses GOOGLE_API_KEY environment variable.
             model_name: The name of the embedding model to use.
+            task_type: The embedding task type sent with every request.
+            batch_size: Maximum number of texts embedded per API request.
         """
         self.api_key = api_key or os.environ.get("GOOGLE_API_KEY")
         if not self.api_key:
             raise ValueError("API key must be provided as parameter or environment variable.")
         
         self.model_name = model_name
+        self.task_type = task_type
+        self.batch_size = batch_size
+        self._embedding_dimension = EMBEDDING_DIMENSIONS.get(model_name.removeprefix("models/"))
         self.client = genai.Client(api_key=self.api_key)
         
     def embed(self, text: Union[str, List[str]]) -> np.ndarray:
@@ -46,11 +67,14 @@ class GeminiEmbeddingModel:
     
     def _embed_single(self, text: str) -> np.ndarray:
         """Generate embedding for a single text string."""
+        return self.embedding_flight.do((self.model_name, self.task_type, text), self._request_single, text)
+
+    def _request_single(self, text: str) -> np.ndarray:
         try:
             result = self.client.models.embed_content(
                 model=self.model_name,
                 contents=text,
-                config=types.EmbedContentConfig(task_type="RETRIEVAL-DOCUMENT"),
+                config=types.EmbedContentConfig(task_type=self.task_type),
             )
             return np.array(result.embeddings[0].values, dtype=np.float32)
         except Exception as e:
@@ -61,12 +85,24 @@ class GeminiEmbeddingModel:
         if not texts:
             return np.array([])
         
+        # One request per batch instead of one per text
         embeddings = []
-        for text in texts:
-            embedding = self._embed_single(text)
-            embeddings.append(embedding)
+        for start in range(0, len(texts), self.batch_size):
+            batch = tuple(texts[start:start + self.batch_size])
+            embeddings.extend(self.embedding_flight.do((self.model_name, self.task_type, batch), self._request_batch, batch))
         
         return np.stack(embeddings)
+
+    def _request_batch(self, texts: Tuple[str, ...]) -> List[np.ndarray]:
+        try:
+            result = self.client.models.embed_content(
+                model=self.model_name,
+                contents=list(texts),
+                config=types.EmbedContentConfig(task_type=self.task_type),
+            )
+        except Exception as e:
+            raise RuntimeError(f"Error generating embeddings: {str(e)}")
+        return [np.array(embedding.values, dtype=np.float32) for embedding in result.embeddings]
     
     # Thêm các phương thức để tương thích với LangChain
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
@@ -99,7 +135,20 @@ class GeminiEmbeddingModel:
     
     @property
     def embedding_dimension(self) -> int:
-        """Get the dimension of the embedding vectors."""
-        sample_text = "Sample text to determine embedding dimension."
-        embedding = self._embed_single(sample_text)
-        return embedding.shape[0]
\ No newline at end of file
+        """
+        Get the dimension of the embedding vectors.
+        Known models are looked up statically, unknown ones are probed once and cached.
+        """
+        if self._embedding_dimension is None:
+            sample_text = "Sample text to determine embedding dimension."
+            self._embedding_dimension = int(self._embed_single(sample_text).shape[0])
+        return self._embedding_dimension
+
+    @property
+    def metadata(self) -> Dict[str, Union[str, int]]:
+        """Description of the vectors this model produces, stored with vector collections."""
+        return {
+            "embedding_model": self.model_name,
+            "embedding_dimension": self.embedding_dimension,
+            "embedding_task_type": self.task_type,
+        }
\ No newline at end of file
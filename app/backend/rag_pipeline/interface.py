@@ -1,9 +1,33 @@
-from typing import List
+from typing import Dict, List, Optional
 from abc import ABC, abstractmethod
 from langchain_core.documents.base import Document
 from langchain_core.embeddings import Embeddings
 from langchain.vectorstores import VectorStore
 
+# Collections whose name contains this separator are internal (e.g. being migrated) and not listed as query indexes
+INTERNAL_COLLECTION_SEPARATOR = "__"
+EMBEDDING_METADATA_KEYS = ("embedding_model", "embedding_dimension", "embedding_task_type")
+
+
+class EmbeddingModelMismatchError(ValueError):
+    """ Raised when a vector index was built with a different embedding model than the one configured. """
+
+
+def get_embedding_metadata(embeddings: Embeddings) -> Dict:
+    """ Embedding model metadata of an embeddings object, empty if it does not describe itself. """
+    return dict(getattr(embeddings, "metadata", None) or {})
+
+
+def is_compatible(index_metadata: Optional[Dict], model_metadata: Dict) -> bool:
+    """ Whether vectors described by index_metadata can be compared with vectors from model_metadata. """
+    index_metadata = index_metadata or {}
+    for key in EMBEDDING_METADATA_KEYS:
+        expected, actual = model_metadata.get(key), index_metadata.get(key)
+        if expected is not None and actual is not None and expected != actual:
+            return False
+    return True
+
+
 class RagWorkflow(ABC):
     """ 
     Interface for the rag workflow 
@@ -11,6 +35,26 @@ class RagWorkflow(ABC):
 
     def __init__(self, embeddings: Embeddings):
         self.embeddings = embeddings
+        self.embeddings_factory = None
+
+    def _get_embeddings_for_index(self, query_id: str) -> Embeddings:
+        """
+        Embedding model matching the vectors of an existing index. Indexes built with another model are served
+        with that model if an embeddings factory is configured, otherwise EmbeddingModelMismatchError is raised.
+        """
+        index_metadata = self.get_index_metadata(query_id)
+        model_metadata = get_embedding_metadata(self.embeddings)
+        if not any(key in index_metadata for key in EMBEDDING_METADATA_KEYS):
+            # New index, or created before model metadata was recorded: assume the configured model
+            return self.embeddings
+        if is_compatible(index_metadata, model_metadata):
+            return self.embeddings
+        if getattr(self, 'embeddings_factory', None) is not None:
+            return self.embeddings_factory(index_metadata["embedding_model"])
+        raise EmbeddingModelMismatchError(
+            f'Vector index for query {query_id} was built with {index_metadata}, '
+            f'but the configured embedding model is {model_metadata}.'
+        )
     
     @abstractmethod
     def create_vector_index_for_user_query(self, documents: List[Document], query_id: str) -> VectorStore:
@@ -24,4 +68,53 @@ class RagWorkflow(ABC):
         """ 
         Get existing vector index from a query ID
         """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def add_documents_to_vector_index(self, documents: List[Document], query_id: str) -> None:
+        """ 
+        Embed and add documents to the existing vector index of a query ID, without rebuilding it
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def delete_vector_index(self, query_id: str) -> None:
+        """ 
+        Delete the vector index of a query ID
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def list_vector_indexes(self) -> List[str]:
+        """ 
+        List query IDs that have a vector index
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_index_metadata(self, query_id: str) -> Dict:
+        """ 
+        Get the embedding model metadata recorded with the vector index of a query ID
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_index_size(self, query_id: str) -> int:
+        """ 
+        Get the size in bytes of the vector index of a query ID, i.e. the disk space deleting it frees
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def list_shared_files(self) -> List[str]:
+        """ 
+        List the paths of files shared by all vector indexes, which deleting an index does not shrink
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def migrate_vector_index(self, query_id: str, batch_size: int = 100) -> int:
+        """ 
+        Re-embed the vector index of a query ID with the configured embedding model, return the number of documents
+        """
         raise NotImplementedError
\ No newline at end of file
@@ -0,0 +1,71 @@
+import threading
+import time
+from typing import Dict, List, Optional
+from backend.rag_pipeline.interface import EMBEDDING_METADATA_KEYS, RagWorkflow, get_embedding_metadata, is_compatible
+import logging
+
+
+class EmbeddingMigrator:
+    """
+    Re-embeds vector indexes that were built with another embedding model than the configured one,
+    one index at a time and in batches, on a background thread. Indexes keep serving with their
+    original model until their migrated copy is swapped in.
+    """
+
+    def __init__(
+        self,
+        rag_workflow: RagWorkflow,
+        batch_size: int = 100,
+        pause_seconds: float = 0.0,
+        include_legacy: bool = False,
+    ):
+        """
+        Args:
+        - rag_workflow (RagWorkflow): Workflow owning the indexes.
+        - batch_size (int): Documents re-embedded per batch.
+        - pause_seconds (float): Pause between indexes, to limit the load on the embedding API.
+        - include_legacy (bool): Also migrate indexes that carry no model metadata.
+        """
+        self.rag_workflow = rag_workflow
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.include_legacy = include_legacy
+        self._thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def needs_migration(self, query_id: str) -> bool:
+        index_metadata = self.rag_workflow.get_index_metadata(query_id)
+        if not any(key in index_metadata for key in EMBEDDING_METADATA_KEYS):
+            return self.include_legacy
+        return not is_compatible(index_metadata, get_embedding_metadata(self.rag_workflow.embeddings))
+
+    def pending(self) -> List[str]:
+        """
+        Query IDs whose vector index has to be migrated.
+        """
+        return [query_id for query_id in self.rag_workflow.list_vector_indexes() if self.needs_migration(query_id)]
+
+    def run(self) -> Dict[str, int]:
+        """
+        Migrate all pending indexes. Returns the number of re-embedded documents per query ID.
+        """
+        migrated = {}
+        for query_id in self.pending():
+            try:
+                migrated[query_id] = self.rag_workflow.migrate_vector_index(query_id, batch_size=self.batch_size)
+            except Exception as e:
+                self.logger.error(f'Migration of vector index for query {query_id} failed: {e}')
+            time.sleep(self.pause_seconds)
+        if migrated:
+            self.logger.info(f'Migrated vector indexes: {migrated}')
+        return migrated
+
+    def start(self) -> threading.Thread:
+        """
+        Run the migration on a background thread, if one is not running already.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.run, name="embedding-migration", daemon=True)
+            self._thread.start()
+        return self._thread
@@ -0,0 +1,173 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+from langchain.vectorstores import VectorStore
+from langchain_core.embeddings import Embeddings
+from langchain_core.documents.base import Document
+from backend.rag_pipeline.interface import RagWorkflow
+from backend.utils.text import create_passages, split_sentences
+import logging
+
+
+PASSAGE_METADATA_KEYS = ("passage_index", "sentence_start")
+
+
+def group_passages(hits: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+    """
+    Group ranked passage hits by abstract, in the order of each abstract's best passage. The passages of an
+    abstract are merged in text order without repeating overlapping sentences, gaps are marked with "...".
+    Documents indexed whole (without passage metadata) are returned as they are.
+    """
+    groups: Dict[str, Dict[str, Any]] = {}
+    for document, score in hits:
+        key = document.metadata.get("source") or document.metadata.get("title") or document.page_content
+        group = groups.setdefault(key, {"score": score, "metadata": document.metadata, "sentences": {}, "passages": 0})
+        group["passages"] += 1
+        start = document.metadata.get("sentence_start")
+        if start is None:
+            group["text"] = document.page_content
+            continue
+        for offset, sentence in enumerate(split_sentences(document.page_content)):
+            group["sentences"][start + offset] = sentence
+
+    grouped = []
+    for group in groups.values():
+        metadata = {key: value for key, value in group["metadata"].items() if key not in PASSAGE_METADATA_KEYS}
+        if "text" in group:
+            grouped.append((Document(page_content=group["text"], metadata=metadata), group["score"]))
+            continue
+        parts, previous = [], None
+        for position in sorted(group["sentences"]):
+            if previous is not None and position != previous + 1:
+                parts.append("...")
+            parts.append(group["sentences"][position])
+            previous = position
+        metadata["passages"] = group["passages"]
+        grouped.append((Document(page_content=" ".join(parts), metadata=metadata), group["score"]))
+    return grouped
+
+
+class PassageIndex(VectorStore):
+    """
+    Vector store over a passage-level index that returns abstracts: the top passages are retrieved and
+    grouped per abstract, so every result cites one abstract but only carries its relevant sentences.
+    """
+
+    def __init__(self, index: VectorStore, passages_per_abstract: int = 3, window_size: int = 3, stride: int = 2):
+        self.index = index
+        self.passages_per_abstract = passages_per_abstract
+        self.window_size = window_size
+        self.stride = stride
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.index.embeddings
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas or [{} for _ in texts])]
+        passages = create_passages(documents, self.window_size, self.stride)
+        return self.index.add_texts([p.page_content for p in passages], [p.metadata for p in passages], **kwargs)
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        The k best abstracts, each with the score of its best passage (as scored by the underlying store).
+        """
+        hits = self.index.similarity_search_with_score(query, k=k * self.passages_per_abstract, **kwargs)
+        return group_passages(hits)[:k]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        vector_store: Optional[Type[VectorStore]] = None,
+        passages_per_abstract: int = 3,
+        window_size: int = 3,
+        stride: int = 2,
+        **kwargs: Any,
+    ) -> "PassageIndex":
+        """
+        Split the texts into passages and index them with `vector_store.from_texts` (remaining kwargs are passed on).
+        """
+        if vector_store is None:
+            raise ValueError("vector_store, the class of the store indexing the passages, is required.")
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas or [{} for _ in texts])]
+        passages = create_passages(documents, window_size, stride)
+        index = vector_store.from_texts(
+            [p.page_content for p in passages], embedding, metadatas=[p.metadata for p in passages], **kwargs
+        )
+        return cls(index, passages_per_abstract, window_size, stride)
+
+
+class PassageRagWorkflow(RagWorkflow):
+    """
+    RAG workflow indexing abstracts as overlapping sentence windows instead of whole abstracts, on top of
+    another workflow (Chroma or quantized) that stores the passages. Retrieval returns the top passages
+    grouped per abstract, which keeps the prompt to the relevant sentences of each cited abstract.
+    Indexes created before passages were enabled keep working and return whole abstracts.
+    """
+
+    def __init__(
+        self,
+        rag_workflow: RagWorkflow,
+        window_size: int = 3,
+        stride: int = 2,
+        passages_per_abstract: int = 3,
+    ):
+        """
+        Args:
+        - rag_workflow (RagWorkflow): Workflow storing the passage indexes.
+        - window_size (int): Sentences per passage.
+        - stride (int): Sentences between the starts of consecutive passages; below `window_size` passages overlap.
+        - passages_per_abstract (int): Passages retrieved per requested abstract before grouping.
+        """
+        if not 0 < stride <= window_size:
+            raise ValueError("stride must be between 1 and window_size.")
+        self.rag_workflow = rag_workflow
+        self.window_size = window_size
+        self.stride = stride
+        self.passages_per_abstract = passages_per_abstract
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def __getattr__(self, name: str) -> Any:
+        # Backend specific attributes and operations (embeddings, compact, ...)
+        return getattr(self.rag_workflow, name)
+
+    def _passages(self, documents: List[Document]) -> List[Document]:
+        passages = create_passages(documents, self.window_size, self.stride)
+        self.logger.info(f'Split {len(documents)} abstracts into {len(passages)} passages')
+        return passages
+
+    def _wrap(self, index: VectorStore) -> PassageIndex:
+        return PassageIndex(index, self.passages_per_abstract, self.window_size, self.stride)
+
+    def create_vector_index_for_user_query(self, documents: List[Document], query_id: str) -> VectorStore:
+        return self._wrap(self.rag_workflow.create_vector_index_for_user_query(self._passages(documents), query_id))
+
+    def get_vector_index_by_user_query(self, query_id: str) -> VectorStore:
+        return self._wrap(self.rag_workflow.get_vector_index_by_user_query(query_id))
+
+    def add_documents_to_vector_index(self, documents: List[Document], query_id: str) -> None:
+        self.rag_workflow.add_documents_to_vector_index(self._passages(documents), query_id)
+
+    def delete_vector_index(self, query_id: str) -> None:
+        self.rag_workflow.delete_vector_index(query_id)
+
+    def list_vector_indexes(self) -> List[str]:
+        return self.rag_workflow.list_vector_indexes()
+
+    def get_index_metadata(self, query_id: str) -> Dict:
+        return self.rag_workflow.get_index_metadata(query_id)
+
+    def get_index_size(self, query_id: str) -> int:
+        return self.rag_workflow.get_index_size(query_id)
+
+    def list_shared_files(self) -> List[str]:
+        return self.rag_workflow.list_shared_files()
+
+    def migrate_vector_index(self, query_id: str, batch_size: int = 100) -> int:
+        return self.rag_workflow.migrate_vector_index(query_id, batch_size)
\ No newline at end of file
@@ -0,0 +1,533 @@
+import json
+import mmap
+import os
+import re
+import shutil
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain.vectorstores import VectorStore
+from langchain_core.embeddings import Embeddings
+from langchain_core.documents.base import Document
+from backend.rag_pipeline.interface import (
+    EMBEDDING_METADATA_KEYS, INTERNAL_COLLECTION_SEPARATOR, RagWorkflow, get_embedding_metadata, is_compatible
+)
+from backend.data.file_utils import FileLock, atomic_write
+import logging
+
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+SCORING_CHUNK_SIZE = 65536
+CURRENT_VERSION_FILE_NAME = "CURRENT"
+WRITER_LOCK_FILE_NAME = ".lock"
+# Version folders are `v<N>-<publish id>`: the ID makes the path unique to one publish, also when a deleted
+# query ID is reused (older indexes have plain `v<N>` folders)
+VERSION_PATTERN = re.compile(r"^v(\d+)(?:-[0-9a-f]+)?$")
+LEGACY_INDEX_FILES = ("codes.npy", "scales.npy", "full.npy", "offsets.npy", "documents.jsonl", "index.json")
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize L2-normalized float32 vectors to the storage dtype.
+    Returns the codes and one float32 scale per vector (int8 uses symmetric per-vector scaling,
+    float types always have a scale of 1).
+    """
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown storage dtype '{dtype}', expected one of {STORAGE_DTYPES}.")
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype != "int8":
+        return vectors.astype(dtype), np.ones(len(vectors), dtype=np.float32)
+    max_abs = np.abs(vectors).max(axis=1) if len(vectors) else np.zeros(0, dtype=np.float32)
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """ L2-normalize vectors so that a dot product equals cosine similarity. """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+class MappedRecords(Sequence):
+    """
+    Read-only view of one field of the records in a memory-mapped documents.jsonl file.
+    Records are decoded on access, so processes opening the same index share the file pages instead of each
+    holding its own copy of the texts.
+    """
+
+    def __init__(self, buffer: mmap.mmap, offsets: np.ndarray, field: str):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.field = field
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(item)
+        return json.loads(self.buffer[self.offsets[item]:self.offsets[item + 1]])[self.field]
+
+
+class QuantizedVectorIndex(VectorStore):
+    """
+    Brute-force cosine similarity index that keeps embeddings as int8 or float16 codes.
+    With rescoring enabled the full-precision vectors are kept as well (memory-mapped when loaded from disk,
+    so only the rows of the candidates are read) and the top `k * rescore_factor` candidates are re-ranked exactly.
+    Rescoring is off by default: the float32 copy makes the index larger on disk than plain float32 storage.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        dtype: str = "int8",
+        rescore: bool = False,
+        rescore_factor: int = 4,
+    ):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown storage dtype '{dtype}', expected one of {STORAGE_DTYPES}.")
+        self.embedding = embedding
+        self.embedding_metadata = get_embedding_metadata(embedding)
+        self.dtype = dtype
+        self.rescore = rescore
+        self.rescore_factor = rescore_factor
+        self.ids: Sequence[str] = []
+        self.texts: Sequence[str] = []
+        self.metadatas: Sequence[dict] = []
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.full_vectors: Optional[np.ndarray] = None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add_vectors(
+        self,
+        vectors: np.ndarray,
+        texts: List[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        """
+        Add precomputed float32 embeddings with their texts to the index.
+        """
+        vectors = normalize(vectors)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        codes, scales = quantize(vectors, self.dtype)
+        if self.codes is None:
+            self.codes, self.scales = codes, scales
+            self.full_vectors = vectors if self.rescore else None
+        else:
+            self.codes = np.concatenate([self.codes, codes])
+            self.scales = np.concatenate([self.scales, scales])
+            if self.rescore:
+                self.full_vectors = np.concatenate([self.full_vectors, vectors])
+        # Indexes loaded from disk are read-only views, copy them before appending
+        self.ids = list(self.ids) + list(ids)
+        self.texts = list(self.texts) + list(texts)
+        self.metadatas = list(self.metadatas) + list(metadatas or [{} for _ in texts])
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = np.array(self.embedding.embed_documents(texts), dtype=np.float32)
+        return self.add_vectors(vectors, texts, metadatas, kwargs.get("ids"))
+
+    def select_rows(self, rows: Sequence[int]) -> "QuantizedVectorIndex":
+        """
+        New index with only the given rows. Stored codes and vectors are copied, nothing is re-embedded.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        index = QuantizedVectorIndex(self.embedding, self.dtype, self.full_vectors is not None, self.rescore_factor)
+        index.embedding_metadata = self.embedding_metadata
+        index.codes = np.asarray(self.codes[rows])
+        index.scales = np.asarray(self.scales[rows])
+        index.full_vectors = np.asarray(self.full_vectors[rows]) if self.full_vectors is not None else None
+        index.ids = [self.ids[row] for row in rows]
+        index.texts = [self.texts[row] for row in rows]
+        index.metadatas = [self.metadatas[row] for row in rows]
+        return index
+
+    def search_vector(self, query_vector: np.ndarray, k: int = 4) -> List[Tuple[int, float]]:
+        """
+        Return (row, cosine similarity) pairs of the k nearest stored vectors.
+        """
+        if not len(self):
+            return []
+        query = normalize(query_vector)[0]
+        n_candidates = min(len(self), k * self.rescore_factor if self.full_vectors is not None else k)
+
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SCORING_CHUNK_SIZE):
+            chunk = self.codes[start:start + SCORING_CHUNK_SIZE].astype(np.float32)
+            scores[start:start + len(chunk)] = chunk @ query
+        scores *= self.scales
+
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        if self.full_vectors is not None:
+            rows = np.sort(candidates)
+            scores_exact = np.asarray(self.full_vectors[rows], dtype=np.float32) @ query
+            candidates, candidate_scores = rows, scores_exact
+        else:
+            candidate_scores = scores[candidates]
+        order = np.argsort(-candidate_scores)[:k]
+        return [(int(candidates[i]), float(candidate_scores[i])) for i in order]
+
+    def _document(self, row: int) -> Document:
+        return Document(page_content=self.texts[row], metadata=self.metadatas[row])
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [self._document(row) for row, _ in self.search_vector(np.array(embedding), k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        query_vector = np.array(self.embedding.embed_query(query), dtype=np.float32)
+        return [(self._document(row), score) for row, score in self.search_vector(query_vector, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Scores are already cosine similarities
+        return lambda score: score
+
+    def save(self, path: str) -> None:
+        """
+        Persist the index to a folder.
+        """
+        os.makedirs(path, exist_ok=True)
+        # Files are replaced atomically, so indexes already loaded (memory-mapped) elsewhere stay valid
+        arrays = {"codes.npy": self.codes, "scales.npy": self.scales, "full.npy": self.full_vectors}
+        for file_name, array in arrays.items():
+            if array is not None:
+                with atomic_write(os.path.join(path, file_name), "wb") as file:
+                    np.save(file, array)
+        offsets = [0]
+        with atomic_write(os.path.join(path, "documents.jsonl"), "wb") as file:
+            for doc_id, text, metadata in zip(self.ids, self.texts, self.metadatas):
+                line = json.dumps({"id": doc_id, "text": text, "metadata": metadata}, ensure_ascii=False).encode("utf-8")
+                file.write(line + b"\n")
+                offsets.append(offsets[-1] + len(line) + 1)
+        with atomic_write(os.path.join(path, "offsets.npy"), "wb") as file:
+            np.save(file, np.array(offsets, dtype=np.int64))
+        with atomic_write(os.path.join(path, "index.json")) as file:
+            json.dump({
+                "dtype": self.dtype,
+                "rescore": self.full_vectors is not None,
+                "embedding": self.embedding_metadata,
+            }, file)
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings, rescore_factor: int = 4) -> "QuantizedVectorIndex":
+        """
+        Load a persisted index read-only. Vectors and documents are memory-mapped rather than read into RAM,
+        so processes opening the same index share its pages through the OS page cache.
+        """
+        with open(os.path.join(path, "index.json"), "r", encoding="utf-8") as file:
+            settings = json.load(file)
+        index = cls(embedding, dtype=settings["dtype"], rescore=settings["rescore"], rescore_factor=rescore_factor)
+        index.embedding_metadata = settings.get("embedding", {})
+        index.codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        index.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+        if settings["rescore"]:
+            index.full_vectors = np.load(os.path.join(path, "full.npy"), mmap_mode="r")
+
+        offsets_path = os.path.join(path, "offsets.npy")
+        documents_path = os.path.join(path, "documents.jsonl")
+        if os.path.exists(offsets_path) and os.path.getsize(documents_path) > 0:
+            with open(documents_path, "rb") as file:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            offsets = np.load(offsets_path, mmap_mode="r")
+            index.ids = MappedRecords(buffer, offsets, "id")
+            index.texts = MappedRecords(buffer, offsets, "text")
+            index.metadatas = MappedRecords(buffer, offsets, "metadata")
+        else:
+            # Indexes saved before offsets were stored
+            with open(documents_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    record = json.loads(line)
+                    index.ids.append(record["id"])
+                    index.texts.append(record["text"])
+                    index.metadatas.append(record["metadata"])
+        return index
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> "QuantizedVectorIndex":
+        index = cls(embedding, **kwargs)
+        index.add_texts(texts, metadatas)
+        return index
+
+
+class QuantizedRag(RagWorkflow):
+    """
+    RAG workflow storing one quantized index per user query in a local folder.
+    Opt-in alternative to ChromaDbRag when disk and RAM use of float32 embeddings matter.
+
+    Indexes are versioned so several processes can share them: every write publishes a complete new version
+    folder (`<query_id>/v<N>-<publish id>/`) and then atomically points the `CURRENT` file at it. Writers are serialized by
+    an inter-process lock per index, readers take no lock and memory-map the version `CURRENT` points to,
+    so they never see a partial write.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embeddings: Embeddings,
+        dtype: str = "int8",
+        rescore: bool = False,
+        rescore_factor: int = 4,
+        embeddings_factory: Optional[Callable[[str], Embeddings]] = None,
+    ):
+        self.persist_directory = persist_directory
+        self.embeddings = embeddings
+        self.embeddings_factory = embeddings_factory
+        self.dtype = dtype
+        self.rescore = rescore
+        self.rescore_factor = rescore_factor
+        # Opened indexes by query ID, with the version folder they map (unique per publish, see VERSION_PATTERN)
+        self._open_indexes: Dict[str, Tuple[str, QuantizedVectorIndex]] = {}
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+        os.makedirs(self.persist_directory, exist_ok=True)
+
+    def _index_path(self, query_id: str) -> str:
+        return os.path.join(self.persist_directory, query_id)
+
+    def _writer_lock(self, query_id: str) -> FileLock:
+        os.makedirs(self._index_path(query_id), exist_ok=True)
+        return FileLock(os.path.join(self._index_path(query_id), WRITER_LOCK_FILE_NAME))
+
+    def _versions(self, query_id: str) -> List[Tuple[int, str]]:
+        """
+        Version numbers and folder names of an index, oldest first.
+        """
+        path = self._index_path(query_id)
+        if not os.path.isdir(path):
+            return []
+        return sorted((int(match.group(1)), match.group(0)) for match in map(VERSION_PATTERN.match, os.listdir(path)) if match)
+
+    def _current_version_path(self, query_id: str) -> str:
+        """
+        Folder of the published version of an index. Indexes saved before versioning live directly in the query folder.
+        """
+        path = self._index_path(query_id)
+        try:
+            with open(os.path.join(path, CURRENT_VERSION_FILE_NAME), "r", encoding="utf-8") as file:
+                return os.path.join(path, file.read().strip())
+        except FileNotFoundError:
+            return path
+
+    def _publish(self, index: QuantizedVectorIndex, query_id: str) -> None:
+        """
+        Save the index as a new version and make it current. The caller holds the writer lock.
+        """
+        path = self._index_path(query_id)
+        versions = self._versions(query_id)
+        version = f"v{max((number for number, _ in versions), default=0) + 1}-{uuid.uuid4().hex[:12]}"
+        index.save(os.path.join(path, version))
+        with atomic_write(os.path.join(path, CURRENT_VERSION_FILE_NAME)) as file:
+            file.write(version)
+        # The previous version is kept for readers that resolved it just before the swap. Older ones can go:
+        # existing memory mappings of removed files stay valid
+        for _, old_version in versions[:-1]:
+            shutil.rmtree(os.path.join(path, old_version), ignore_errors=True)
+        for file_name in LEGACY_INDEX_FILES:
+            if os.path.exists(os.path.join(path, file_name)):
+                os.remove(os.path.join(path, file_name))
+        self.logger.info(f'Published version {version} of vector index for {query_id}')
+
+    def _load(self, query_id: str) -> QuantizedVectorIndex:
+        embeddings = self._get_embeddings_for_index(query_id)
+        try:
+            return QuantizedVectorIndex.load(self._current_version_path(query_id), embeddings, self.rescore_factor)
+        except FileNotFoundError:
+            # The resolved version was removed by concurrent writes, resolve again
+            return QuantizedVectorIndex.load(self._current_version_path(query_id), embeddings, self.rescore_factor)
+
+    def create_vector_index_for_user_query(self, documents: List[Document], query_id: str) -> VectorStore:
+        """
+        Create a quantized vector index for the documents and persist it under the query ID.
+        """
+        self.logger.info(f'Creating {self.dtype} vector index for {query_id}')
+        try:
+            index = QuantizedVectorIndex.from_texts(
+                [doc.page_content for doc in documents],
+                self.embeddings,
+                metadatas=[doc.metadata for doc in documents],
+                dtype=self.dtype,
+                rescore=self.rescore,
+                rescore_factor=self.rescore_factor,
+            )
+            with self._writer_lock(query_id):
+                self._publish(index, query_id)
+            return index
+        except Exception as e:
+            self.logger.error(f'There was an issue creating vector index for query: {query_id}. The issue: {e}')
+            raise
+
+    def get_vector_index_by_user_query(self, query_id: str) -> VectorStore:
+        """
+        Open the current version of the persisted index of a query, read-only. The index is reused
+        until a newer version is published.
+        """
+        try:
+            version_path = self._current_version_path(query_id)
+            cached = self._open_indexes.get(query_id)
+            if cached is not None and cached[0] == version_path:
+                return cached[1]
+            self.logger.info(f'Loading vector index for query: {query_id}')
+            index = self._load(query_id)
+            self._open_indexes[query_id] = (version_path, index)
+            return index
+        except Exception as e:
+            self.logger.error(f'There was an issue retrieving vector index for query: {query_id}. The issue: {e}')
+            raise
+
+    def add_documents_to_vector_index(self, documents: List[Document], query_id: str) -> None:
+        """
+        Embed only the new documents and publish a new version of the index with them appended.
+        """
+        self.logger.info(f'Adding {len(documents)} documents to vector index for {query_id}')
+        try:
+            texts = [doc.page_content for doc in documents]
+            # Embedding is the slow part, done before taking the writer lock
+            index_metadata = self.get_index_metadata(query_id)
+            vectors = np.array(self._get_embeddings_for_index(query_id).embed_documents(texts), dtype=np.float32)
+            with self._writer_lock(query_id):
+                index = self._load(query_id)
+                if self.get_index_metadata(query_id) != index_metadata:
+                    # Migrated meanwhile: embed again with the model of the published index
+                    self.logger.info(f'Vector index for {query_id} was migrated meanwhile, embedding the documents again')
+                    vectors = np.array(index.embedding.embed_documents(texts), dtype=np.float32)
+                index.add_vectors(vectors, texts, [doc.metadata for doc in documents])
+                self._publish(index, query_id)
+        except Exception as e:
+            self.logger.error(f'There was an issue adding documents to vector index for query: {query_id}. The issue: {e}')
+            raise
+
+    def remove_documents_from_vector_index(self, query_id: str, predicate: Callable[[dict], bool]) -> int:
+        """
+        Remove the documents whose metadata matches `predicate` and publish a new version of the index without them.
+        Returns the number of documents removed.
+        """
+        with self._writer_lock(query_id):
+            index = self._load(query_id)
+            kept = [row for row, metadata in enumerate(index.metadatas) if not predicate(metadata)]
+            removed = len(index) - len(kept)
+            if removed:
+                self._publish(index.select_rows(kept), query_id)
+                self.logger.info(f'Removed {removed} documents from vector index for {query_id}')
+            return removed
+
+    def delete_vector_index(self, query_id: str) -> None:
+        """
+        Delete the persisted index folder of a query.
+        """
+        path = self._index_path(query_id)
+        self._open_indexes.pop(query_id, None)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+            self.logger.info(f'Vector index for query {query_id} has been deleted.')
+        else:
+            self.logger.warning(f'Vector index for query {query_id} does not exist and cannot be deleted.')
+
+    def list_vector_indexes(self) -> List[str]:
+        """
+        List query IDs with a persisted index.
+        """
+        return [
+            name for name in os.listdir(self.persist_directory)
+            if INTERNAL_COLLECTION_SEPARATOR not in name
+            and os.path.exists(os.path.join(self._current_version_path(name), "index.json"))
+        ]
+
+    def get_index_size(self, query_id: str) -> int:
+        """
+        Total size of the files in the index folder of a query (all its versions), in bytes.
+        """
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(self._index_path(query_id))
+            for name in files
+        )
+
+    def list_shared_files(self) -> List[str]:
+        """
+        Every index lives in its own folder, deleting it frees all of its files.
+        """
+        return []
+
+    def get_index_metadata(self, query_id: str) -> Dict:
+        """
+        Embedding model metadata stored with the index of a query.
+        """
+        try:
+            with open(os.path.join(self._current_version_path(query_id), "index.json"), "r", encoding="utf-8") as file:
+                return json.load(file).get("embedding", {})
+        except FileNotFoundError:
+            return {}
+
+    def migrate_vector_index(self, query_id: str, batch_size: int = 100) -> int:
+        """
+        Re-embed the index of a query with the configured embedding model. The current version keeps serving
+        queries until the re-embedded one is published. Migrations of the same index from several processes
+        are serialized; the later ones find it migrated and do nothing.
+        """
+        with self._writer_lock(query_id):
+            metadata, model_metadata = self.get_index_metadata(query_id), get_embedding_metadata(self.embeddings)
+            if any(key in metadata for key in EMBEDDING_METADATA_KEYS) and is_compatible(metadata, model_metadata):
+                self.logger.info(f'Vector index for query {query_id} is already migrated.')
+                return len(self._load(query_id))
+            source = self._load(query_id)
+            target = QuantizedVectorIndex(
+                self.embeddings, dtype=self.dtype, rescore=self.rescore, rescore_factor=self.rescore_factor
+            )
+            for start in range(0, len(source), batch_size):
+                texts = source.texts[start:start + batch_size]
+                vectors = np.array(self.embeddings.embed_documents(texts), dtype=np.float32)
+                target.add_vectors(vectors, texts, source.metadatas[start:start + batch_size], source.ids[start:start + batch_size])
+                self.logger.info(f'Migrated {min(start + batch_size, len(source))}/{len(source)} documents of {query_id}.')
+            self._publish(target, query_id)
+            return len(target)
+
+
+def evaluate_recall(
+    corpus_vectors: np.ndarray,
+    query_vectors: np.ndarray,
+    k: int = 10,
+    dtype: str = "int8",
+    rescore: bool = False,
+    rescore_factor: int = 4,
+) -> float:
+    """
+    Compute recall@k of a quantized index against exact float32 cosine search on the same vectors.
+    """
+    exact = QuantizedVectorIndex(embedding=None, dtype="float32", rescore=False)
+    approximate = QuantizedVectorIndex(embedding=None, dtype=dtype, rescore=rescore, rescore_factor=rescore_factor)
+    texts = [""] * len(corpus_vectors)
+    exact.add_vectors(corpus_vectors, texts)
+    approximate.add_vectors(corpus_vectors, texts)
+
+    hits = 0
+    for query_vector in query_vectors:
+        expected = {row for row, _ in exact.search_vector(query_vector, k)}
+        found = {row for row, _ in approximate.search_vector(query_vector, k)}
+        hits += len(expected & found)
+    return hits / (k * len(query_vectors))
@@ -1 +1,16 @@
-from .pubmed_retriever import PubMedAbstractRetriever
\ No newline at end of file
+import importlib
+
+# Retrievers are imported when first used, so that the offline mirror does not pull in the PubMed client and the LLM
+_EXPORTS = {
+    "PubMedAbstractRetriever": ".pubmed_retriever",
+    "PubMedMirror": ".pubmed_mirror",
+    "PubMedMirrorRetriever": ".pubmed_mirror",
+    "CompositeAbstractRetriever": ".composite",
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
\ No newline at end of file
@@ -0,0 +1,151 @@
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+from backend.data.models import ScientificAbstract
+from backend.retriever.interface import AbstractRetriever
+import logging
+
+
+def abstract_keys(abstract: ScientificAbstract) -> List[str]:
+    """ Identity keys of an abstract: PMID, DOI and normalized title, whichever are known. """
+    keys = []
+    if abstract.pmid:
+        keys.append(f"pmid:{abstract.pmid}")
+    if abstract.doi:
+        keys.append(f"doi:{abstract.doi.strip().lower()}")
+    if abstract.title:
+        keys.append("title:" + re.sub(r"\W+", " ", abstract.title.lower()).strip())
+    return keys
+
+
+class CompositeAbstractRetriever(AbstractRetriever):
+    """
+    Query several retrievers in parallel and merge their results with reciprocal rank fusion,
+    de-duplicated by PMID, DOI or title. Every source has a deadline; sources that miss it are left out
+    and the partial results of the others are returned, so latency is bounded by the deadlines
+    rather than by the slowest source. Every source runs on its own threads, and a source with too many calls
+    still running past their deadlines is skipped, so a slow source never delays the others.
+    """
+
+    def __init__(
+        self,
+        retrievers: Dict[str, AbstractRetriever],
+        deadline_seconds: float = 10.0,
+        source_deadlines: Optional[Dict[str, float]] = None,
+        source_weights: Optional[Dict[str, float]] = None,
+        max_abstracts: int = 10,
+        sufficient_abstracts: Optional[int] = None,
+        rrf_k: int = 60,
+        max_in_flight: int = 4,
+    ):
+        """
+        Args:
+        - retrievers (Dict[str, AbstractRetriever]): Sources by name.
+        - deadline_seconds (float): Default time a source is waited for.
+        - source_deadlines (Dict[str, float]): Per-source deadlines overriding the default.
+        - source_weights (Dict[str, float]): Per-source weights in the rank fusion (default 1).
+        - max_abstracts (int): Number of merged abstracts returned.
+        - sufficient_abstracts (int): Stop waiting for the remaining sources as soon as this many distinct
+          abstracts have been collected. By default all sources are waited for until their deadline.
+        - rrf_k (int): Reciprocal rank fusion constant.
+        - max_in_flight (int): Calls per source that may run at once (the threads of the source), including calls
+          that missed their deadline and finish in the background. A source with all its threads busy is skipped
+          rather than queued, as a queued call would only start after its deadline.
+        """
+        self.retrievers = retrievers
+        self.deadline_seconds = deadline_seconds
+        self.source_deadlines = source_deadlines or {}
+        self.source_weights = source_weights or {}
+        self.max_abstracts = max_abstracts
+        self.sufficient_abstracts = sufficient_abstracts
+        self.rrf_k = rrf_k
+        self.max_in_flight = max_in_flight
+        # Not used as context managers: calls that missed their deadline finish in the background
+        self.executors = {
+            name: ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix=f"retriever-{name}")
+            for name in retrievers
+        }
+        self.in_flight = {name: 0 for name in retrievers}
+        self._in_flight_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def _submit(self, name: str, scientist_question: str) -> Optional[Future]:
+        with self._in_flight_lock:
+            if self.in_flight[name] >= self.max_in_flight:
+                self.logger.warning(f'Source {name} has {self.in_flight[name]} calls still running, skipping it.')
+                return None
+            self.in_flight[name] += 1
+        future = self.executors[name].submit(self.retrievers[name].get_abstract_data, scientist_question)
+        future.add_done_callback(lambda _: self._finished(name))
+        return future
+
+    def _finished(self, name: str) -> None:
+        with self._in_flight_lock:
+            self.in_flight[name] -= 1
+
+    def _collect(self, scientist_question: str) -> Dict[str, List[ScientificAbstract]]:
+        start = time.monotonic()
+        futures: Dict[Future, str] = {}
+        for name in self.retrievers:
+            future = self._submit(name, scientist_question)
+            if future is not None:
+                futures[future] = name
+        deadlines = {name: start + self.source_deadlines.get(name, self.deadline_seconds) for name in self.retrievers}
+        results: Dict[str, List[ScientificAbstract]] = {}
+        pending = set(futures)
+
+        while pending:
+            now = time.monotonic()
+            for future in [f for f in pending if deadlines[futures[f]] <= now]:
+                pending.discard(future)
+                self.logger.warning(f'Source {futures[future]} missed its deadline, returning partial results.')
+            if not pending:
+                break
+            timeout = min(deadlines[futures[f]] for f in pending) - now
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                    self.logger.info(f'Source {name} returned {len(results[name])} abstracts in {time.monotonic() - start:.2f}s.')
+                except Exception as e:
+                    self.logger.error(f'Source {name} failed: {e}')
+            if self.sufficient_abstracts and len(self.fuse(results)) >= self.sufficient_abstracts:
+                break
+        return results
+
+    def fuse(self, results: Dict[str, List[ScientificAbstract]]) -> List[ScientificAbstract]:
+        """
+        Merge ranked result lists with reciprocal rank fusion. Duplicates across (and within) sources are merged,
+        missing fields of the first copy are filled from the others.
+        """
+        merged: List[ScientificAbstract] = []
+        scores: List[float] = []
+        key_to_position: Dict[str, int] = {}
+        for name, abstracts in results.items():
+            weight = self.source_weights.get(name, 1.0)
+            for rank, abstract in enumerate(abstracts):
+                keys = abstract_keys(abstract)
+                position = next((key_to_position[key] for key in keys if key in key_to_position), None)
+                if position is None:
+                    position = len(merged)
+                    merged.append(abstract.model_copy())
+                    scores.append(0.0)
+                else:
+                    existing = merged[position]
+                    for field, value in abstract.model_dump().items():
+                        if getattr(existing, field) is None and value is not None:
+                            setattr(existing, field, value)
+                scores[position] += weight / (self.rrf_k + rank + 1)
+                for key in keys + abstract_keys(merged[position]):
+                    key_to_position.setdefault(key, position)
+
+        order = sorted(range(len(merged)), key=lambda i: scores[i], reverse=True)
+        return [merged[i] for i in order]
+
+    def get_abstract_data(self, scientist_question: str) -> List[ScientificAbstract]:
+        """ Retrieve abstracts from all sources in parallel and return the fused top results. """
+        return self.fuse(self._collect(scientist_question))[:self.max_abstracts]
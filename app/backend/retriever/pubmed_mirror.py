@@ -0,0 +1,315 @@
+import gzip
+import os
+import re
+import sqlite3
+import tempfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, contextmanager
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from backend.data.models import ScientificAbstract
+from backend.retriever.interface import AbstractRetriever
+import logging
+
+
+ArticleRow = Tuple[str, Optional[str], Optional[str], Optional[str], Optional[int], str]
+# A PMID with its new row, or None when the article was deleted (or no longer has an abstract)
+ArticleChange = Tuple[str, Optional[ArticleRow]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    pmid TEXT PRIMARY KEY,
+    doi TEXT,
+    title TEXT,
+    authors TEXT,
+    year INTEGER,
+    abstract TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, abstract, content='articles', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS articles_insert AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts(rowid, title, abstract) VALUES (new.rowid, new.title, new.abstract);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_delete AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts(articles_fts, rowid, title, abstract) VALUES ('delete', old.rowid, old.title, old.abstract);
+END;
+"""
+
+STAGING_SCHEMA = """
+CREATE TABLE changes (pmid TEXT NOT NULL, doi TEXT, title TEXT, authors TEXT, year INTEGER, abstract TEXT);
+"""
+
+STOPWORDS = set("""
+a an and are as at be by can does do for from has have how in is it of on or that the this to was what
+when where which who why with between about into their there these those than then its our your
+""".split())
+
+
+def _text(element: Optional[ET.Element]) -> Optional[str]:
+    """ Text content of an element including nested markup (e.g. <i>, <sup>). """
+    if element is None:
+        return None
+    text = "".join(element.itertext()).strip()
+    return text or None
+
+
+def _parse_article(citation: ET.Element, article_ids: Optional[ET.Element]) -> Optional[ArticleRow]:
+    pmid = _text(citation.find("PMID"))
+    article = citation.find("Article")
+    if pmid is None or article is None:
+        return None
+    abstract_parts = []
+    for part in article.findall("Abstract/AbstractText"):
+        text = _text(part)
+        if text:
+            label = part.get("Label")
+            abstract_parts.append(f"{label}: {text}" if label else text)
+    if not abstract_parts:
+        return None
+
+    doi = None
+    for element in article.findall("ELocationID"):
+        if element.get("EIdType") == "doi":
+            doi = _text(element)
+    if doi is None and article_ids is not None:
+        for element in article_ids.findall("ArticleId"):
+            if element.get("IdType") == "doi":
+                doi = _text(element)
+
+    authors = []
+    for author in article.findall("AuthorList/Author"):
+        name = " ".join(filter(None, (_text(author.find("LastName")), _text(author.find("Initials")))))
+        name = name or _text(author.find("CollectiveName"))
+        if name:
+            authors.append(name)
+
+    year = _text(article.find("Journal/JournalIssue/PubDate/Year"))
+    if year is None:
+        medline_date = _text(article.find("Journal/JournalIssue/PubDate/MedlineDate")) or ""
+        match = re.search(r"\d{4}", medline_date)
+        year = match.group(0) if match else None
+
+    return (pmid, doi, _text(article.find("ArticleTitle")), ", ".join(authors), int(year) if year else None, " ".join(abstract_parts))
+
+
+def iter_pubmed_changes(source: Union[str, IO[bytes]]) -> Iterator[ArticleChange]:
+    """
+    Stream the changes of a PubMed baseline/update XML file (optionally gzipped) or a binary file object,
+    in file order: every article with its row, and None for PMIDs listed in <DeleteCitation> or articles
+    without an abstract. Parsed elements are cleared as soon as they are consumed, so memory use
+    does not depend on the file size.
+    """
+    if isinstance(source, str):
+        stream = gzip.open(source, "rb") if source.endswith(".gz") else open(source, "rb")
+    else:
+        stream = source
+    try:
+        context = ET.iterparse(stream, events=("start", "end"))
+        _, root = next(context)
+        for event, element in context:
+            if event != "end":
+                continue
+            if element.tag == "PubmedArticle":
+                citation = element.find("MedlineCitation")
+                pmid = _text(citation.find("PMID")) if citation is not None else None
+                if pmid is not None:
+                    yield pmid, _parse_article(citation, element.find("PubmedData/ArticleIdList"))
+                root.clear()
+            elif element.tag == "DeleteCitation":
+                for pmid in element.findall("PMID"):
+                    if _text(pmid):
+                        yield _text(pmid), None
+                root.clear()
+    finally:
+        if stream is not source:
+            stream.close()
+
+
+def iter_pubmed_articles(source: Union[str, IO[bytes]]) -> Iterator[ArticleRow]:
+    """
+    Stream the articles with an abstract from a PubMed baseline/update XML file or a binary file object.
+    """
+    return (row for _, row in iter_pubmed_changes(source) if row is not None)
+
+
+def _stage_file(args: Tuple[str, str]) -> str:
+    """
+    Parse one XML file into a staging SQLite database in `staging_folder` (run in a worker process).
+    Rows are written as they are parsed, so neither the worker nor the parent holds the whole file.
+    """
+    path, staging_folder = args
+    fd, staging_path = tempfile.mkstemp(dir=staging_folder, suffix=".db")
+    os.close(fd)
+    with closing(sqlite3.connect(staging_path)) as connection, connection:
+        connection.executescript(STAGING_SCHEMA)
+        connection.executemany(
+            "INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?)",
+            (row if row is not None else (pmid, None, None, None, None, None) for pmid, row in iter_pubmed_changes(path)),
+        )
+    return staging_path
+
+
+def _iter_staged(staging_path: str, batch_size: int) -> Iterator[ArticleChange]:
+    connection = sqlite3.connect(staging_path)
+    try:
+        cursor = connection.execute("SELECT pmid, doi, title, authors, year, abstract FROM changes ORDER BY rowid")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row[0], (row if row[5] is not None else None)
+    finally:
+        connection.close()
+
+
+class PubMedMirror:
+    """
+    Local PubMed mirror: an SQLite database with a full-text (FTS5) index over titles and abstracts,
+    built from the PubMed baseline and update XML files.
+    """
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Connection to the mirror, committed (or rolled back on error) and closed on exit.
+        """
+        with closing(sqlite3.connect(self.database_path)) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                yield connection
+
+    def _apply(self, connection: sqlite3.Connection, changes: Iterable[ArticleChange]) -> Tuple[int, int]:
+        # Update files revise or delete earlier records: the last change of each PMID wins. Replacing goes
+        # through delete + insert, the delete trigger keeps the FTS index in sync
+        latest: Dict[str, Optional[ArticleRow]] = dict(changes)
+        connection.executemany("DELETE FROM articles WHERE pmid = ?", [(pmid,) for pmid in latest])
+        rows = [row for row in latest.values() if row is not None]
+        connection.executemany("INSERT INTO articles VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows), len(latest) - len(rows)
+
+    def _load_changes(self, connection: sqlite3.Connection, changes: Iterable[ArticleChange], batch_size: int) -> Tuple[int, int]:
+        loaded, removed, batch = 0, 0, []
+        for change in changes:
+            batch.append(change)
+            if len(batch) >= batch_size:
+                counts = self._apply(connection, batch)
+                connection.commit()
+                loaded, removed, batch = loaded + counts[0], removed + counts[1], []
+        counts = self._apply(connection, batch)
+        connection.commit()
+        return loaded + counts[0], removed + counts[1]
+
+    def load_file(self, source: Union[str, IO[bytes]], batch_size: int = 5000) -> int:
+        """
+        Stream one XML file into the mirror, committing every `batch_size` changes. Deleted citations
+        are removed. Returns the number of articles loaded.
+        """
+        with self._connect() as connection:
+            loaded, removed = self._load_changes(connection, iter_pubmed_changes(source), batch_size)
+        self.logger.info(f'Loaded {loaded} articles, removed {removed}.')
+        return loaded
+
+    def load_files(self, paths: Sequence[str], workers: Optional[int] = None, batch_size: int = 5000) -> int:
+        """
+        Load many XML files. Files are parsed in parallel worker processes into staging databases next to
+        the mirror, which this process applies in the order of `paths` so that update files override the baseline.
+        """
+        paths = sorted(paths)
+        if workers == 1 or len(paths) < 2:
+            return sum(self.load_file(path, batch_size) for path in paths)
+
+        total = 0
+        staging_parent = os.path.dirname(os.path.abspath(self.database_path))
+        with tempfile.TemporaryDirectory(dir=staging_parent, prefix=".staging-") as staging_folder, \
+                ProcessPoolExecutor(max_workers=workers) as executor, self._connect() as connection:
+            staged = executor.map(_stage_file, [(path, staging_folder) for path in paths])
+            for path, staging_path in zip(paths, staged):
+                loaded, removed = self._load_changes(connection, _iter_staged(staging_path, batch_size), batch_size)
+                os.remove(staging_path)
+                total += loaded
+                self.logger.info(f'Loaded {loaded} articles from {path}, removed {removed}.')
+        return total
+
+    def search(self, query: str, limit: int = 10) -> List[ScientificAbstract]:
+        """
+        Full-text search over titles and abstracts, ranked by BM25.
+        """
+        match_expression = to_match_expression(query)
+        if not match_expression:
+            return []
+        with self._connect() as connection:
+            rows = connection.execute(
+                """
+                SELECT a.pmid, a.doi, a.title, a.authors, a.year, a.abstract
+                FROM articles_fts JOIN articles a ON a.rowid = articles_fts.rowid
+                WHERE articles_fts MATCH ?
+                ORDER BY bm25(articles_fts, 2.0, 1.0)
+                LIMIT ?
+                """,
+                (match_expression, limit),
+            ).fetchall()
+        return [
+            ScientificAbstract(pmid=pmid, doi=doi, title=title, authors=authors, year=year, abstract_content=abstract)
+            for pmid, doi, title, authors, year, abstract in rows
+        ]
+
+    def count(self) -> int:
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+
+def to_match_expression(query: str) -> str:
+    """
+    Turn a free-text question into an FTS5 expression: significant terms OR-ed together, so BM25
+    ranks documents matching more of them first.
+    """
+    terms = [term for term in re.findall(r"\w+", query.lower()) if term not in STOPWORDS and len(term) > 1]
+    return " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+
+
+class PubMedMirrorRetriever(AbstractRetriever):
+    """
+    Retriever answering from a local PubMed mirror, without network access.
+    """
+
+    def __init__(self, mirror: PubMedMirror, max_abstracts: int = 10):
+        self.mirror = mirror
+        self.max_abstracts = max_abstracts
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def get_abstract_data(self, scientist_question: str) -> List[ScientificAbstract]:
+        """ Retrieve abstract list for scientist query from the local mirror. """
+        abstracts = self.mirror.search(scientist_question, limit=self.max_abstracts)
+        self.logger.info(f'Total of {len(abstracts)} abstracts retrieved from the local mirror.')
+        return abstracts
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description="Build or query a local PubMed mirror from baseline/update XML files.")
+    parser.add_argument("database", help="Path of the SQLite mirror database.")
+    parser.add_argument("--load", nargs="*", default=[], help="XML(.gz) files or glob patterns to load.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--search", help="Run a search against the mirror.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    mirror = PubMedMirror(args.database)
+    paths = [path for pattern in args.load for path in glob.glob(pattern)]
+    if paths:
+        print(f'Loaded {mirror.load_files(paths, workers=args.workers)} articles, {mirror.count()} in the mirror.')
+    if args.search:
+        for abstract in PubMedMirrorRetriever(mirror).get_abstract_data(args.search):
+            print(f'{abstract.pmid} {abstract.year} {abstract.title}')
@@ -1,20 +1,31 @@
-from typing import List
+from datetime import date
+from typing import Iterator, List, Optional
 from metapub import PubMedFetcher
 from backend.data.models import ScientificAbstract
 from backend.retriever.interface import AbstractRetriever
 from backend.retriever.pubmed_simplify_query import simplify_pubmed_query
+from backend.utils.single_flight import SingleFlight
 import logging
 
 class PubMedAbstractRetriever(AbstractRetriever):
-    def __init__(self, pubmed_fetch_object: PubMedFetcher):
+    # Shared by all retrievers: concurrent fetches of the same PMID (overlapping ingests, refreshes) are done once
+    article_flight = SingleFlight("pubmed_article")
+
+    def __init__(self, pubmed_fetch_object: PubMedFetcher, max_abstracts: int = 10, simplify_query: bool = True):
         self.pubmed_fetch_object = pubmed_fetch_object
+        self.max_abstracts = max_abstracts
+        self.simplify_query = simplify_query
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.INFO)
 
     def _simplify_pubmed_query(self, query: str, simplification_function: callable = simplify_pubmed_query) -> str:
         return simplification_function(query)
 
-    def _get_abstract_list(self, query: str, simplify_query: bool = True) -> List[str]:
+    def build_search_query(self, scientist_question: str) -> str:
+        """ Simplify a scientist question into the PubMed search query used to find abstracts. """
+        return self._simplify_pubmed_query(scientist_question)
+
+    def _get_abstract_list(self, query: str, simplify_query: bool = True, since: Optional[date] = None) -> List[str]:
         """ Fetch a list of PubMed IDs for the given query. """
         if simplify_query:
             self.logger.info(f'Trying to simplify scientist query {query}')
@@ -27,15 +38,19 @@ class PubMedAbstractRetriever(AbstractRetriever):
                 self.logger.info('Initial query is simple enough and does not need simplification.')
 
         self.logger.info(f'Searching abstracts for query: {query}')
+        if since is not None:
+            # PubMed date filters need both ends of the range
+            return self.pubmed_fetch_object.pmids_for_query(
+                query, since=since.strftime('%Y/%m/%d'), until=date.today().strftime('%Y/%m/%d')
+            )
         return self.pubmed_fetch_object.pmids_for_query(query)
 
     def _get_abstracts(self, pubmed_ids: List[str]) -> List[ScientificAbstract]:
         """ Fetch PubMed abstracts  """
         self.logger.info(f'Fetching abstract data for following pubmed_ids: {pubmed_ids}')
         scientific_abstracts = []
-        max_abstracts = min(10, len(pubmed_ids))  # Limit to 10 abstracts for performance
-        for id in pubmed_ids[:max_abstracts]:
-            abstract = self.pubmed_fetch_object.article_by_pmid(id)
+        for id in pubmed_ids:
+            abstract = self.article_flight.do(str(id), self.pubmed_fetch_object.article_by_pmid, id)
             if abstract.abstract is None:
                 continue
             
@@ -44,7 +59,8 @@ class PubMedAbstractRetriever(AbstractRetriever):
                 title=abstract.title,
                 authors=', '.join(abstract.authors),
                 year=abstract.year,
-                abstract_content=abstract.abstract
+                abstract_content=abstract.abstract,
+                pmid=str(id),
             )
             scientific_abstracts.append(abstract_formatted)
 
@@ -52,11 +68,49 @@ class PubMedAbstractRetriever(AbstractRetriever):
         
         return scientific_abstracts
 
-    def get_abstract_data(self, scientist_question: str, simplify_query: bool = True) -> List[ScientificAbstract]:
-        """  Retrieve abstract list for scientist query. """
+    def get_abstract_data(self, scientist_question: str, simplify_query: Optional[bool] = None) -> List[ScientificAbstract]:
+        """  Retrieve abstract list for scientist query. Simplifies the query unless disabled here or on the retriever. """
+        if simplify_query is None:
+            simplify_query = self.simplify_query
         pmids = self._get_abstract_list(scientist_question, simplify_query)
-        abstracts = self._get_abstracts(pmids)
+        abstracts = self._get_abstracts(pmids[:self.max_abstracts])
         return abstracts
+
+    def get_new_abstract_data(
+        self,
+        search_query: str,
+        since: date,
+        known_pmids: Optional[set] = None,
+        max_abstracts: Optional[int] = None,
+    ) -> List[ScientificAbstract]:
+        """
+        Retrieve abstracts published since a given date for an already simplified search query,
+        fetching only PMIDs that are not in `known_pmids`.
+        """
+        known_pmids = known_pmids or set()
+        pmids = [pmid for pmid in self._get_abstract_list(search_query, simplify_query=False, since=since)
+                 if str(pmid) not in known_pmids]
+        return self._get_abstracts(pmids[:max_abstracts or self.max_abstracts])
+
+    def iter_abstract_batches(
+        self,
+        scientist_question: str,
+        first_batch_size: Optional[int] = None,
+        batch_size: int = 10,
+        max_abstracts: Optional[int] = None,
+        simplify_query: bool = True,
+    ) -> Iterator[List[ScientificAbstract]]:
+        """
+        Search once, then fetch the found abstracts lazily in batches: a first batch of `first_batch_size`
+        (defaults to max_abstracts set on the retriever), followed by batches of `batch_size`, up to `max_abstracts` PMIDs.
+        """
+        pmids = self._get_abstract_list(scientist_question, simplify_query)
+        if max_abstracts is not None:
+            pmids = pmids[:max_abstracts]
+        start, size = 0, first_batch_size or self.max_abstracts
+        while start < len(pmids):
+            yield self._get_abstracts(pmids[start:start + size])
+            start, size = start + size, batch_size
     
 if __name__ == "__main__":
     pubmed_fetch = PubMedAbstractRetriever(PubMedFetcher())
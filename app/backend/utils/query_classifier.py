@@ -0,0 +1,271 @@
+import json
+import math
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from langchain_core.prompts import PromptTemplate
+from backend.utils.text import normalize_question
+import logging
+
+
+QUERY_TYPES = ("scientific", "translation", "summarization", "general")
+
+KEYWORDS = {
+    "translation": (
+        "translate", "translation", "into english", "into vietnamese", "in english", "in vietnamese",
+        "dịch", "dịch sang", "sang tiếng anh", "sang tiếng việt", "tiếng anh là gì", "nghĩa là gì",
+    ),
+    "summarization": (
+        "summarize", "summarise", "summary", "tl;dr", "key points", "shorten", "main points",
+        "tóm tắt", "tóm lược", "ý chính", "rút gọn", "nội dung chính",
+    ),
+    "general": (
+        "hello", "hi", "hey", "thanks", "thank you", "who are you", "what can you do", "how are you",
+        "xin chào", "chào", "cảm ơn", "bạn là ai", "bạn có thể làm gì", "bạn khỏe không",
+    ),
+    "scientific": (
+        "disease", "treatment", "therapy", "therapies", "cancer", "tumor", "gene", "genetic", "protein", "drug",
+        "patients", "clinical", "trial", "diabetes", "virus", "viral", "infection", "vaccine", "symptom",
+        "risk", "mechanism", "cell", "cells", "dose", "efficacy", "diagnosis", "biomarker", "syndrome",
+        "pubmed", "study", "studies", "mortality", "receptor", "inhibitor", "antibody", "microbiota",
+        "bệnh", "điều trị", "thuốc", "ung thư", "triệu chứng", "nguy cơ", "tiểu đường", "vắc xin", "gen",
+        "tế bào", "hiệu quả", "tác dụng", "nghiên cứu", "chẩn đoán", "nhiễm trùng", "virus", "liều",
+    ),
+}
+# Medical term suffixes, so that unseen terms like "osteoporosis" or "hepatitis" still count
+SCIENTIFIC_SUFFIXES = ("itis", "osis", "oma", "emia", "pathy", "ectomy", "plasia", "genesis", "mab", "vir")
+
+VIETNAMESE_CHARS = set("ăâđêôơưàảãáạằẳẵắặầẩẫấậèẻẽéẹềểễếệìỉĩíịòỏõóọồổỗốộờởỡớợùủũúụừửữứựỳỷỹýỵ")
+
+FEATURES = (
+    "bias", "translation_keywords", "summarization_keywords", "general_keywords", "scientific_keywords",
+    "is_vietnamese", "log_length", "question_mark", "long_text", "quoted_text",
+)
+
+# Hand-tuned weights, one row per query type over FEATURES. Replace them with LinearQueryModel.fit on labelled questions.
+# The Vietnamese keyword lists are shorter, so Vietnamese messages without keywords lean scientific (most of them
+# are health questions) and towards translation, and away from small talk.
+DEFAULT_WEIGHTS = {
+    "scientific":    [0.5, -1.0, -1.0, -1.0, 1.5, 0.5, 0.3, 0.3, 0.0, 0.0],
+    "translation":   [-1.0, 3.0, 0.0, 0.0, 0.0, 0.3, 0.0, 0.0, 0.5, 0.5],
+    "summarization": [-1.0, 0.0, 3.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.5, 0.3],
+    "general":       [0.3, 0.0, 0.0, 2.5, -1.5, -0.3, -0.3, 0.0, -1.0, 0.0],
+}
+
+
+def _count_keywords(text: str, words: Sequence[str], keywords: Sequence[str]) -> int:
+    count = 0
+    for keyword in keywords:
+        if " " in keyword or ";" in keyword:
+            count += keyword in text
+        else:
+            count += keyword in words
+    return count
+
+
+def extract_features(question: str) -> List[float]:
+    """
+    Compute the cheap local features of a question, in the order of FEATURES.
+    """
+    text = normalize_question(question)
+    words = set(re.findall(r"\w+", text))
+    n_words = max(1, len(text.split()))
+    keyword_counts = {query_type: _count_keywords(text, words, keywords) for query_type, keywords in KEYWORDS.items()}
+    keyword_counts["scientific"] += sum(1 for word in words if len(word) > 5 and word.endswith(SCIENTIFIC_SUFFIXES))
+    return [
+        1.0,
+        min(keyword_counts["translation"], 3),
+        min(keyword_counts["summarization"], 3),
+        min(keyword_counts["general"], 3),
+        min(keyword_counts["scientific"], 3),
+        float(any(char in VIETNAMESE_CHARS for char in text)),
+        math.log(n_words),
+        float("?" in text),
+        float(n_words > 80),
+        float(any(quote in text for quote in ('"', '“', "'"))),
+    ]
+
+
+def _softmax(scores: Sequence[float]) -> List[float]:
+    top = max(scores)
+    exps = [math.exp(score - top) for score in scores]
+    total = sum(exps)
+    return [value / total for value in exps]
+
+
+class LinearQueryModel:
+    """
+    Multinomial logistic regression over the features of extract_features.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, List[float]]] = None):
+        # A copy, so that fit() does not change the caller's weights or DEFAULT_WEIGHTS
+        self.weights = {query_type: list(row) for query_type, row in (weights or DEFAULT_WEIGHTS).items()}
+
+    def predict_proba(self, features: Sequence[float]) -> Dict[str, float]:
+        scores = [sum(w * x for w, x in zip(self.weights[query_type], features)) for query_type in QUERY_TYPES]
+        return dict(zip(QUERY_TYPES, _softmax(scores)))
+
+    def fit(self, questions: Sequence[str], labels: Sequence[str], epochs: int = 200, learning_rate: float = 0.1) -> "LinearQueryModel":
+        """
+        Train the weights with batch gradient descent on labelled questions, starting from the current weights.
+        """
+        samples = [extract_features(question) for question in questions]
+        for _ in range(epochs):
+            gradients = {query_type: [0.0] * len(FEATURES) for query_type in QUERY_TYPES}
+            for features, label in zip(samples, labels):
+                probabilities = self.predict_proba(features)
+                for query_type in QUERY_TYPES:
+                    error = probabilities[query_type] - (query_type == label)
+                    for i, value in enumerate(features):
+                        gradients[query_type][i] += error * value / len(samples)
+            for query_type in QUERY_TYPES:
+                self.weights[query_type] = [
+                    w - learning_rate * g for w, g in zip(self.weights[query_type], gradients[query_type])
+                ]
+        return self
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"features": FEATURES, "weights": self.weights}, file, indent=4)
+
+    @classmethod
+    def load(cls, path: str) -> "LinearQueryModel":
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        if tuple(data["features"]) != FEATURES:
+            raise ValueError(f"Model at {path} was trained on different features.")
+        return cls(data["weights"])
+
+
+class ClassificationStats:
+    """
+    Thread-safe record of recent classification latencies and LLM fallbacks.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.latencies = deque(maxlen=window)
+        self.total = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency_seconds: float, used_fallback: bool) -> None:
+        with self._lock:
+            self.latencies.append(latency_seconds)
+            self.total += 1
+            self.fallbacks += used_fallback
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Latency percentiles (milliseconds) over the recent window and the overall LLM fallback rate.
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+            total, fallbacks = self.total, self.fallbacks
+        if not latencies:
+            return {"count": 0, "fallback_rate": 0.0}
+
+        def percentile(p: float) -> float:
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        return {
+            "count": total,
+            "p50_ms": percentile(0.50),
+            "p90_ms": percentile(0.90),
+            "p99_ms": percentile(0.99),
+            "max_ms": latencies[-1] * 1000,
+            "fallback_rate": fallbacks / total,
+        }
+
+
+query_classification_prompt = PromptTemplate.from_template("""
+    Classify the following user message into exactly one of these categories:
+    scientific - a biomedical or scientific question that should be answered from research abstracts,
+    translation - a request to translate text,
+    summarization - a request to summarize text,
+    general - greetings, questions about the assistant or any other conversation.
+    Answer with the category name only.
+
+    Message: {question}
+    """)
+
+
+def llm_classify_query(question: str) -> str:
+    """ Ask the LLM for the query type. Only used when the local classifier is not confident. """
+    from components.llm import llm
+    answer = llm.invoke(query_classification_prompt.format(question=question)).content.strip().lower()
+    return next((query_type for query_type in QUERY_TYPES if query_type in answer), "scientific")
+
+
+class QueryClassifier:
+    """
+    Route questions to a query type using local features and a small linear model.
+    The LLM is only asked when the local prediction is below `confidence_threshold`.
+    """
+
+    def __init__(
+        self,
+        model: Optional[LinearQueryModel] = None,
+        llm_fallback: Optional[Callable[[str], str]] = llm_classify_query,
+        confidence_threshold: float = 0.6,
+        cache_size: int = 1024,
+    ):
+        self.model = model or LinearQueryModel()
+        self.llm_fallback = llm_fallback
+        self.confidence_threshold = confidence_threshold
+        self.stats = ClassificationStats()
+        self._predict_cached = lru_cache(maxsize=cache_size)(self._predict_local)
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def _predict_local(self, normalized_question: str) -> Tuple[str, float]:
+        probabilities = self.model.predict_proba(extract_features(normalized_question))
+        query_type = max(probabilities, key=probabilities.get)
+        return query_type, probabilities[query_type]
+
+    def classify(self, question: str) -> str:
+        start = time.perf_counter()
+        query_type, confidence = self._predict_cached(normalize_question(question))
+        used_fallback = False
+        if confidence < self.confidence_threshold and self.llm_fallback is not None:
+            try:
+                query_type = self.llm_fallback(question)
+                used_fallback = True
+            except Exception as e:
+                self.logger.warning(f'LLM query classification failed, using local prediction {query_type}: {e}')
+        self.stats.record(time.perf_counter() - start, used_fallback)
+        return query_type
+
+
+default_classifier = QueryClassifier()
+
+
+def classify_query(question: str) -> str:
+    """ Classify a user question as scientific, translation, summarization or general. """
+    return default_classifier.classify(question)
+
+
+if __name__ == "__main__":
+    classifier = QueryClassifier(llm_fallback=None)
+    questions = [
+        "Does abamectin cause cancer?",
+        "What is the relationship between dental cavities and osteoporosis",
+        "Tác động của ô nhiễm không khí đến sức khỏe hô hấp ở trẻ em",
+        "Uống cà phê mỗi ngày có hại cho tim mạch không?",
+        "Cảm ơn nhé",
+        "Dịch sang tiếng Anh: bệnh tiểu đường type 2",
+        "Tóm tắt đoạn văn sau giúp tôi",
+        "Xin chào, bạn là ai?",
+        "Please summarize the key points of this paragraph",
+        "Thanks!",
+    ]
+    for question in questions:
+        features = extract_features(question)
+        print(f'{classifier.classify(question):<14} {max(classifier.model.predict_proba(features).values()):.2f}  {question}')
+    for _ in range(1000):
+        for question in questions:
+            classifier.classify(question + " " + str(_))
+    print(classifier.stats.summary())
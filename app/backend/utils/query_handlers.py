@@ -0,0 +1,58 @@
+from typing import Callable
+from langchain_core.prompts import PromptTemplate
+from components.llm import llm
+
+
+def handle_translation_query(question: str) -> str:
+    """ Translate the text in the user request between Vietnamese and English. """
+    return llm.invoke(translation_prompt.format(question=question)).content
+
+
+def handle_summarization_query(question: str) -> str:
+    """ Summarize the text in the user request. """
+    return llm.invoke(summarization_prompt.format(question=question)).content
+
+
+def handle_general_query(question: str) -> str:
+    """ Answer greetings and other non-scientific messages. """
+    return llm.invoke(general_prompt.format(question=question)).content
+
+
+QUERY_HANDLERS = {
+    "translation": handle_translation_query,
+    "summarization": handle_summarization_query,
+    "general": handle_general_query,
+}
+
+
+def get_handler_for_query_type(query_type: str) -> Callable[[str], str]:
+    """ Return the handler answering a non-scientific query type. """
+    if query_type not in QUERY_HANDLERS:
+        raise ValueError(f"No handler for query type '{query_type}', expected one of {list(QUERY_HANDLERS)}.")
+    return QUERY_HANDLERS[query_type]
+
+
+translation_prompt = PromptTemplate.from_template("""
+    You are a professional translator specialized in biomedical texts.
+    Translate the text in the following request. If the text is in Vietnamese, translate it to English,
+    otherwise translate it to Vietnamese, unless the request names the target language.
+    Keep medical terminology accurate and answer with the translation only.
+
+    Request: {question}
+    """)
+
+summarization_prompt = PromptTemplate.from_template("""
+    You are a knowledgeable expert in the biomedicine field.
+    Summarize the text in the following request concisely, keeping the key findings and numbers.
+    Answer in the language of the request.
+
+    Request: {question}
+    """)
+
+general_prompt = PromptTemplate.from_template("""
+    You are PubMed Searcher, a chatbot that answers biomedical questions using abstracts from PubMed,
+    and can also translate and summarize texts. Reply briefly and politely to the following message,
+    in the language of the message.
+
+    Message: {question}
+    """)
@@ -0,0 +1,47 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory
+
+
+class SessionHistoryStore:
+    """
+    In-memory chat histories by session ID, for clients without Streamlit session state (e.g. the HTTP API).
+    The least recently used sessions are dropped beyond `max_sessions`, idle sessions after `ttl_seconds`,
+    and every history keeps its last `max_messages` messages.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: Optional[float] = 86400, max_messages: int = 50):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self._sessions: "OrderedDict[str, Tuple[float, InMemoryChatMessageHistory]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> BaseChatMessageHistory:
+        """
+        History of a session, created if missing.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.ttl_seconds is not None:
+                while self._sessions:
+                    oldest_id, (last_used, _) = next(iter(self._sessions.items()))
+                    if now - last_used <= self.ttl_seconds:
+                        break
+                    del self._sessions[oldest_id]
+            _, history = self._sessions.pop(session_id, (now, None))
+            history = history or InMemoryChatMessageHistory()
+            del history.messages[:-self.max_messages]
+            self._sessions[session_id] = (now, history)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return history
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
\ No newline at end of file
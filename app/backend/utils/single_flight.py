@@ -0,0 +1,80 @@
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Counters per group name, shared by all SingleFlight instances with that name
+_STATS: Dict[str, Counter] = defaultdict(Counter)
+_STATS_LOCK = threading.Lock()
+
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Counters of all single-flight groups: calls, executions (calls that ran the work), coalesced (calls that
+    waited for another call's result) and failures (executions that raised).
+    """
+    with _STATS_LOCK:
+        return {name: dict(counter) for name, counter in _STATS.items()}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.leader = threading.get_ident()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesce identical work in flight: while a call for a key is running, further calls for the same key
+    from other threads wait for it and get its result instead of repeating the work. If it fails, the waiting
+    callers get the same exception. Results are not cached: once the call is done, the next call runs again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, event: str) -> None:
+        with _STATS_LOCK:
+            _STATS[self.name][event] += 1
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def do(self, key: Hashable, function: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        Run `function(*args, **kwargs)` unless a call for `key` is already running, in which case wait for it.
+        """
+        self._count("calls")
+        with self._lock:
+            call = self._calls.get(key)
+            # Nested calls for the same key from the running call itself must not wait for themselves
+            is_leader = call is None or call.leader == threading.get_ident()
+            if call is None:
+                call = self._calls[key] = _Call()
+            elif is_leader:
+                call = None
+
+        if not is_leader:
+            self._count("coalesced")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        self._count("executions")
+        if call is None:
+            return function(*args, **kwargs)
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            self._count("failures")
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,38 @@
+import re
+import unicodedata
+from typing import Iterable, List
+from langchain_core.documents.base import Document
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\[])")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Key of a question for matching and coalescing: Unicode NFC (so Vietnamese typed with precomposed or
+    combining diacritics is the same), lowercase, whitespace collapsed.
+    """
+    return " ".join(unicodedata.normalize("NFC", question).lower().split())
+
+
+def split_sentences(text: str) -> List[str]:
+    """ Split an abstract into sentences at '.', '!' or '?' followed by a capitalized word or a number. """
+    return [sentence for sentence in SENTENCE_BOUNDARY.split(text.strip()) if sentence]
+
+
+def create_passages(documents: Iterable[Document], window_size: int = 3, stride: int = 2) -> List[Document]:
+    """
+    Split documents into overlapping windows of `window_size` sentences, starting every `stride` sentences.
+    Passages keep the metadata of their abstract (title, DOI, ...) to be grouped back for citation.
+    """
+    passages = []
+    for document in documents:
+        sentences = split_sentences(document.page_content)
+        if not sentences:
+            continue
+        starts = range(0, max(1, len(sentences) - window_size + stride), stride)
+        for passage_index, start in enumerate(starts):
+            passages.append(Document(
+                page_content=" ".join(sentences[start:start + window_size]),
+                metadata={**document.metadata, "passage_index": passage_index, "sentence_start": start},
+            ))
+    return passages
\ No newline at end of file
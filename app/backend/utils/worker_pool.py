@@ -0,0 +1,96 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+
+class QueueFullError(Exception):
+    """ Raised when a request arrives while all workers are busy and the wait queue is full. """
+
+
+class WorkerPool:
+    """
+    Run blocking work (retrieval, embedding, LLM calls) from async handlers on a fixed number of worker threads.
+    At most `max_queue` requests wait for a worker; beyond that new requests are rejected right away
+    with QueueFullError, so overload shows up as fast rejections instead of growing latency.
+    Admission and release happen on the event loop thread.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 16):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api-worker")
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._admitted = 0
+
+    @property
+    def admitted(self) -> int:
+        """ Requests running or waiting for a worker. """
+        return self._admitted
+
+    def check_capacity(self) -> None:
+        """
+        Raise QueueFullError if a request arriving now would be rejected, without admitting it.
+        """
+        if self._admitted >= self.max_workers + self.max_queue:
+            raise QueueFullError(f"{self._admitted} requests in progress or queued")
+
+    def reserve(self) -> None:
+        """
+        Admit a request, or raise QueueFullError. Every reservation must be released.
+        """
+        self.check_capacity()
+        self._admitted += 1
+
+    def release(self) -> None:
+        self._admitted -= 1
+
+    async def run(self, function: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        Admit the request and run `function` on a worker thread.
+        """
+        self.reserve()
+        try:
+            async with self._semaphore:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self.executor, functools.partial(function, *args, **kwargs)
+                )
+        finally:
+            self.release()
+
+    async def stream(self, make_iterator: Callable[[], Iterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Iterate a blocking iterator on a worker thread, holding one worker for the whole stream.
+        The request is admitted when iteration starts (raising QueueFullError if the pool is full) and released
+        when the stream ends or is closed, so a stream that is never iterated holds nothing.
+        """
+        loop = asyncio.get_running_loop()
+        end = object()
+        self.reserve()
+        try:
+            async with self._semaphore:
+                iterator, pending = None, loop.run_in_executor(self.executor, make_iterator)
+                try:
+                    iterator = await asyncio.shield(pending)
+                    while True:
+                        pending = loop.run_in_executor(self.executor, next, iterator, end)
+                        item = await asyncio.shield(pending)
+                        if item is end:
+                            break
+                        yield item
+                finally:
+                    await self._close_stream(pending, iterator)
+        finally:
+            self.release()
+
+    async def _close_stream(self, pending: asyncio.Future, iterator: Optional[Iterator[Any]]) -> None:
+        """
+        When a client disconnects, the worker thread may still be inside the blocking call. Wait for that call and
+        close the iterator (e.g. the LLM HTTP stream) on a worker thread, before the worker is given back.
+        """
+        await asyncio.wait([pending])
+        if not pending.cancelled() and pending.exception() is None and iterator is None:
+            iterator = pending.result()
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await asyncio.get_running_loop().run_in_executor(self.executor, close)
\ No newline at end of file
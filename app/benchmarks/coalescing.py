@@ -0,0 +1,129 @@
+"""
+Several sessions ask the same new question at the same time. Without coalescing every session searches PubMed,
+fetches the articles, embeds them and creates its own query; with single-flight coalescing the first session
+does the work and the others wait for its result. Also checks that when the work fails, every waiting session
+gets the failure.
+
+PubMed is simulated with fixed latencies, so the benchmark runs offline.
+
+Run from the `app` folder:
+    python -m benchmarks.coalescing --sessions 8
+"""
+import argparse
+import tempfile
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableLambda
+from components.prompts import qa_template
+from backend.data.local_data_store import LocalJSONStore
+from backend.pipeline.answering import AnswerPipeline
+from backend.pipeline.progressive import ProgressiveIngestor
+from backend.rag_pipeline.quantized import QuantizedRag
+from backend.retriever.pubmed_retriever import PubMedAbstractRetriever
+from backend.utils.single_flight import single_flight_stats
+
+QUESTION = "Does vitamin D supplementation reduce fracture risk in older adults?"
+CALLS = Counter()
+
+
+class SimulatedPubMed:
+    """ Stand-in for PubMedFetcher with network-like latencies. """
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+
+    def pmids_for_query(self, query: str, **kwargs) -> List[str]:
+        CALLS["search"] += 1
+        time.sleep(0.3)
+        if self.fail:
+            raise ConnectionError("PubMed is unavailable")
+        return [str(30000000 + i) for i in range(10)]
+
+    def article_by_pmid(self, pmid: str):
+        CALLS["fetch"] += 1
+        time.sleep(0.02)
+        return SimpleNamespace(
+            doi=f"10.1000/{pmid}", title=f"Article {pmid}", authors=["Author A"], year=2020,
+            abstract=f"Abstract of article {pmid}. Vitamin D and fracture risk.",
+        )
+
+
+class OfflineRetriever(PubMedAbstractRetriever):
+    def _simplify_pubmed_query(self, query: str, simplification_function: callable = None) -> str:
+        return query
+
+
+class CountingEmbeddings(Embeddings):
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        CALLS["embed"] += 1
+        time.sleep(0.1)
+        return np.random.default_rng(len(texts)).normal(size=(len(texts), 64)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def ask_concurrently(pipeline: AnswerPipeline, sessions: int, coalesce: bool) -> List[object]:
+    barrier = threading.Barrier(sessions)
+    results: List[object] = [None] * sessions
+    get_vector_index = pipeline.get_vector_index if coalesce else pipeline._get_vector_index
+
+    def session(i: int) -> None:
+        barrier.wait()
+        try:
+            results[i] = get_vector_index(QUESTION)[0]
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def run(sessions: int) -> bool:
+    ok = True
+    print(f"{sessions} sessions asking the same new question")
+    print(f"{'mode':<12} {'queries':>7} {'searches':>8} {'fetches':>7} {'embeds':>6} {'seconds':>7}")
+    for coalesce in (False, True):
+        with tempfile.TemporaryDirectory() as folder:
+            CALLS.clear()
+            store = LocalJSONStore(f"{folder}/data")
+            rag = QuantizedRag(f"{folder}/vectors", CountingEmbeddings())
+            ingestor = ProgressiveIngestor(OfflineRetriever(SimulatedPubMed()), store, rag, max_abstracts=10)
+            pipeline = AnswerPipeline(store, rag, ingestor, RunnableLambda(lambda prompt: prompt), qa_template)
+            start = time.perf_counter()
+            query_ids = ask_concurrently(pipeline, sessions, coalesce)
+            elapsed = time.perf_counter() - start
+            mode = "coalesced" if coalesce else "independent"
+            print(f"{mode:<12} {len(set(query_ids)):>7} {CALLS['search']:>8} {CALLS['fetch']:>7} {CALLS['embed']:>6} {elapsed:>7.2f}")
+            if coalesce:
+                ok = ok and len(set(query_ids)) == 1 and CALLS["search"] == 1
+
+    with tempfile.TemporaryDirectory() as folder:
+        store = LocalJSONStore(f"{folder}/data")
+        rag = QuantizedRag(f"{folder}/vectors", CountingEmbeddings())
+        ingestor = ProgressiveIngestor(OfflineRetriever(SimulatedPubMed(fail=True)), store, rag)
+        pipeline = AnswerPipeline(store, rag, ingestor, RunnableLambda(lambda prompt: prompt), qa_template)
+        errors = [result for result in ask_concurrently(pipeline, sessions, True) if isinstance(result, ConnectionError)]
+        print(f"failing search: {len(errors)}/{sessions} sessions got the error")
+        ok = ok and len(errors) == sessions
+
+    print(f"single-flight counters: {single_flight_stats()}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8)
+    args = parser.parse_args()
+    ok = run(args.sessions)
+    print("OK" if ok else "FAILED")
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,67 @@
+"""
+Stress test for LocalJSONStore: several processes save datasets into the same folder at once, then
+several threads save through one shared store instance (as the app's sessions and background threads do).
+Checks that every save got a distinct query ID, that the index lists all of them and that every
+dataset reads back complete.
+
+Run from the `app` folder:
+    python -m benchmarks.concurrent_saves --processes 8 --threads 8 --saves 25
+"""
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+from typing import List
+from backend.data.local_data_store import LocalJSONStore
+from benchmarks.storage_format import make_abstracts
+
+ABSTRACTS_PER_SAVE = 20
+
+
+def save_many(args) -> List[str]:
+    folder, worker, saves = args[:3]
+    store = args[3] if len(args) > 3 else LocalJSONStore(folder)
+    abstracts = make_abstracts(ABSTRACTS_PER_SAVE, seed=worker)
+    return [store.save_dataset(abstracts, f"worker {worker} question {i}") for i in range(saves)]
+
+
+def check(folder: str, label: str, results: List[List[str]], expected: int, elapsed: float) -> bool:
+    query_ids = [query_id for worker_ids in results for query_id in worker_ids]
+    store = LocalJSONStore(folder)
+    index = store.get_list_of_queries()
+    incomplete = [query_id for query_id in query_ids if len(store.read_dataset(query_id)) != ABSTRACTS_PER_SAVE]
+
+    print(f"{expected} saves from {label} in {elapsed:.2f}s")
+    print(f"distinct query IDs: {len(set(query_ids))}/{expected}")
+    print(f"indexed queries:    {len(index)}/{expected}")
+    print(f"incomplete datasets: {len(incomplete)}")
+    return len(set(query_ids)) == expected and len(index) == expected and not incomplete
+
+
+def run(processes: int, threads: int, saves: int) -> bool:
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        with Pool(processes) as pool:
+            results = pool.map(save_many, [(folder, worker, saves) for worker in range(processes)])
+        ok = check(folder, f"{processes} processes", results, processes * saves, time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as folder:
+        # One store, and so one index lock instance, shared by all threads
+        store = LocalJSONStore(folder)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            results = list(executor.map(save_many, [(folder, worker, saves, store) for worker in range(threads)]))
+        ok = check(folder, f"{threads} threads", results, threads * saves, time.perf_counter() - start) and ok
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--saves", type=int, default=25, help="Saves per process.")
+    args = parser.parse_args()
+    ok = run(args.processes, args.threads, args.saves)
+    print("OK" if ok else "FAILED")
+    raise SystemExit(0 if ok else 1)
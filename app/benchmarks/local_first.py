@@ -0,0 +1,115 @@
+"""
+Answer latency and PubMed waits for new questions with and without local-first answering.
+
+Earlier queries have stored abstracts on a set of topics. New questions, none asked before, are then asked
+about the same topics (covered by the stored corpus) and about new topics (not covered). With local-first
+answering the covered questions are answered from the stored abstracts and PubMed is only searched in the
+background; the uncovered ones fall back to PubMed as before.
+
+PubMed is simulated with fixed latencies and embeddings are hashed bags of words, so the benchmark runs offline.
+Hashed bag-of-words similarities are lower than those of a real embedding model, hence the lower threshold.
+
+Run from the `app` folder:
+    python -m benchmarks.local_first --topics 10 --min-similarity 0.3
+"""
+import argparse
+import random
+import tempfile
+import time
+import warnings
+from collections import Counter
+from types import SimpleNamespace
+from typing import List
+from langchain_core.runnables import RunnableLambda
+from components.prompts import qa_template
+from backend.data.local_data_store import LocalJSONStore
+from backend.pipeline.answering import AnswerPipeline
+from backend.pipeline.local_first import CorpusIndex
+from backend.pipeline.progressive import ProgressiveIngestor
+from backend.rag_pipeline.quantized import QuantizedRag
+from benchmarks.coalescing import OfflineRetriever
+from benchmarks.passage_context import VOCABULARY, HashingEmbeddings
+
+CALLS = Counter()
+ARTICLES_PER_SEARCH = 10
+
+
+class TopicPubMed:
+    """ Stand-in for PubMedFetcher returning articles on the topic named in the query, with network-like latencies. """
+
+    def pmids_for_query(self, query: str, **kwargs) -> List[str]:
+        CALLS["search"] += 1
+        time.sleep(0.5)
+        topic = int(query.split("topic")[1].split()[0])
+        return [f"{topic}-{i}" for i in range(ARTICLES_PER_SEARCH)]
+
+    def article_by_pmid(self, pmid: str):
+        CALLS["fetch"] += 1
+        time.sleep(0.05)
+        topic, i = (int(part) for part in pmid.split("-"))
+        rng = random.Random(pmid)
+        filler = " ".join(rng.choices(VOCABULARY, k=8))
+        return SimpleNamespace(
+            doi=f"10.1000/{pmid}", title=f"Topic {topic} study {i}", authors=["Author A"], year=2020,
+            abstract=f"Treatment topic{topic} outcome{topic} trial{topic} cohort{topic}. {filler}.",
+        )
+
+
+def wait_for_background(ingestor: ProgressiveIngestor, corpus: CorpusIndex) -> None:
+    for task in list(ingestor.background_tasks.values()):
+        task.result()
+    if corpus._sync_task:
+        corpus._sync_task.result()
+
+
+def question(topic: int, variant: int) -> str:
+    return f"What is known about topic{topic} outcome{topic} trial{topic} cohort{topic} (variant {variant})?"
+
+
+def run(topics: int, min_similarity: float, min_abstracts: int) -> bool:
+    # Hashed bag-of-words vectors of unrelated texts can have slightly negative cosine similarities
+    warnings.filterwarnings("ignore", message="Relevance scores must be between 0 and 1")
+    ok = True
+    print(f"topics stored={topics} new questions={2 * topics} min_similarity={min_similarity} min_abstracts={min_abstracts}")
+    print(f"{'mode':<12} {'covered':>8} {'local':>6} {'waited':>6} {'seconds/question':>17}")
+    for local_first in (False, True):
+        with tempfile.TemporaryDirectory() as folder:
+            embeddings = HashingEmbeddings()
+            store = LocalJSONStore(f"{folder}/data")
+            rag = QuantizedRag(f"{folder}/vectors", embeddings)
+            ingestor = ProgressiveIngestor(OfflineRetriever(TopicPubMed()), store, rag, max_abstracts=ARTICLES_PER_SEARCH)
+            corpus = CorpusIndex(store, QuantizedRag(f"{folder}/corpus", embeddings), f"{folder}/corpus_state.json",
+                                 min_similarity=min_similarity, min_abstracts=min_abstracts)
+            pipeline = AnswerPipeline(store, rag, ingestor, RunnableLambda(lambda prompt: prompt), qa_template,
+                                      corpus=corpus if local_first else None)
+            for topic in range(topics):
+                pipeline.get_vector_index(question(topic, 0))
+            wait_for_background(ingestor, corpus)
+            corpus.sync()
+            search_and_ingest = ingestor.ingest
+            ingestor.ingest = lambda scientist_question: CALLS.update(["ingest"]) or search_and_ingest(scientist_question)
+
+            for covered, first_topic in (("yes", 0), ("no", topics)):
+                CALLS.clear()
+                start = time.perf_counter()
+                for topic in range(first_topic, first_topic + topics):
+                    pipeline.get_vector_index(question(topic, 1))
+                elapsed = (time.perf_counter() - start) / topics
+                local = topics - CALLS["ingest"]
+                mode = "local-first" if local_first else "pubmed"
+                print(f"{mode:<12} {covered:>8} {local:>6} {CALLS['ingest']:>6} {elapsed:>17.2f}")
+                if local_first:
+                    ok = ok and local == (topics if covered == "yes" else 0)
+            wait_for_background(ingestor, corpus)
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topics", type=int, default=10)
+    parser.add_argument("--min-similarity", type=float, default=0.3)
+    parser.add_argument("--min-abstracts", type=int, default=5)
+    args = parser.parse_args()
+    ok = run(args.topics, args.min_similarity, args.min_abstracts)
+    print("OK" if ok else "FAILED")
+    raise SystemExit(0 if ok else 1)
\ No newline at end of file
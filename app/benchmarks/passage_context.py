@@ -0,0 +1,108 @@
+"""
+Prompt context size and grounding of whole-abstract retrieval versus passage-level retrieval.
+
+Every synthetic abstract contains one "finding" sentence that a question is asked about. For each question
+the top abstracts are retrieved as the answer prompt would receive them, and the benchmark reports the
+context size (approximate tokens, 4 characters each), how often the finding sentence is in the context
+(grounding) and how often its abstract is cited. Embeddings are hashed bags of words, so no API is needed.
+
+Run from the `app` folder:
+    python -m benchmarks.passage_context --n 500 --questions 200
+"""
+import argparse
+import random
+import re
+import tempfile
+import zlib
+from typing import List
+import numpy as np
+from langchain_core.documents.base import Document
+from langchain_core.embeddings import Embeddings
+from backend.rag_pipeline.interface import RagWorkflow
+from backend.rag_pipeline.passages import PassageRagWorkflow
+from backend.rag_pipeline.quantized import QuantizedRag
+from backend.utils.text import create_passages
+from benchmarks.storage_format import WORDS
+
+SENTENCES_PER_ABSTRACT = 10
+# Filler vocabulary, larger than the benchmark word list so that abstracts are not all alike
+VOCABULARY = WORDS + [f"{word}{j}" for word in WORDS for j in range(50)]
+
+
+class HashingEmbeddings(Embeddings):
+    """ L2-normalized bag-of-words vectors with words hashed into `dim` buckets, with a hashed sign against collisions. """
+
+    def __init__(self, dim: int = 2048):
+        self.dim = dim
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            word_hash = zlib.crc32(word.encode())
+            vector[word_hash % self.dim] += 1.0 if word_hash & (1 << 31) else -1.0
+        return (vector / max(np.linalg.norm(vector), 1e-12)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def make_corpus(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    documents, findings = [], []
+    for i in range(n):
+        sentences = [" ".join(rng.choices(VOCABULARY, k=20)).capitalize() + "." for _ in range(SENTENCES_PER_ABSTRACT)]
+        finding = f"Compound cx{i} reduced marker mk{i} levels in the treated cohort."
+        sentences[rng.randrange(SENTENCES_PER_ABSTRACT)] = finding
+        documents.append(Document(
+            page_content=" ".join(sentences),
+            metadata={"title": f"Study {i}", "source": f"10.1000/bench.{i}"},
+        ))
+        findings.append(finding)
+    return documents, findings
+
+
+def evaluate(rag: RagWorkflow, findings: List[str], question_ids: List[int], cut_off: int) -> dict:
+    index = rag.get_vector_index_by_user_query("query_1")
+    tokens, grounded, cited = [], 0, 0
+    for i in question_ids:
+        documents = index.similarity_search(f"Does compound cx{i} reduce marker mk{i}?", k=cut_off)
+        context = "; ".join(f"ABSTRACT TITLE: {doc.metadata['title']}, ABSTRACT CONTENT: {doc.page_content}" for doc in documents)
+        tokens.append(len(context) / 4)
+        grounded += findings[i] in context
+        cited += any(doc.metadata["source"] == f"10.1000/bench.{i}" for doc in documents)
+    return {
+        "tokens": float(np.mean(tokens)),
+        "grounding": grounded / len(question_ids),
+        "cited": cited / len(question_ids),
+    }
+
+
+def run(n: int, questions: int, cut_off: int, window_size: int, stride: int) -> None:
+    documents, findings = make_corpus(n)
+    question_ids = random.Random(1).sample(range(n), min(questions, n))
+    embeddings = HashingEmbeddings()
+    print(f"abstracts={n} questions={len(question_ids)} cut_off={cut_off} window={window_size} stride={stride}")
+    print(f"{'index':<10} {'vectors':>8} {'tokens/answer':>14} {'grounding':>10} {'cited':>7}")
+    with tempfile.TemporaryDirectory() as folder:
+        workflows = {
+            "abstract": QuantizedRag(f"{folder}/abstract", embeddings, dtype="float32", rescore=False),
+            "passage": PassageRagWorkflow(
+                QuantizedRag(f"{folder}/passage", embeddings, dtype="float32", rescore=False), window_size, stride
+            ),
+        }
+        for name, rag in workflows.items():
+            rag.create_vector_index_for_user_query(documents, "query_1")
+            vectors = len(create_passages(documents, window_size, stride)) if name == "passage" else len(documents)
+            result = evaluate(rag, findings, question_ids, cut_off)
+            print(f"{name:<10} {vectors:>8} {result['tokens']:>14.0f} {result['grounding']:>10.3f} {result['cited']:>7.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=500, help="Number of abstracts.")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--cut-off", type=int, default=5, help="Abstracts passed to the LLM.")
+    parser.add_argument("--window-size", type=int, default=3)
+    parser.add_argument("--stride", type=int, default=2)
+    args = parser.parse_args()
+    run(args.n, args.questions, args.cut_off, args.window_size, args.stride)
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Report recall@k of int8/float16 embedding storage against float32 on a fixed evaluation set,
+together with the bytes stored per vector (rescoring variants also store the float32 vectors).
+
+The default evaluation set is a seeded, clustered synthetic corpus with the dimension of Gemini embeddings.
+Pass --index to evaluate on the embeddings of a persisted QuantizedRag index instead
+(its full-precision vectors if it was built with rescoring, otherwise its dequantized codes, are used as corpus,
+and a held-out sample of them as queries).
+
+Run from the `app` folder:
+    python -m benchmarks.quantized_recall --k 10
+"""
+import argparse
+import os
+import numpy as np
+from backend.rag_pipeline.quantized import CURRENT_VERSION_FILE_NAME, evaluate_recall, normalize
+
+
+def make_evaluation_set(n_corpus: int, n_queries: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n_corpus // 50), dim))
+    corpus = centers[rng.integers(len(centers), size=n_corpus)] + 0.6 * rng.normal(size=(n_corpus, dim))
+    queries = centers[rng.integers(len(centers), size=n_queries)] + 0.6 * rng.normal(size=(n_queries, dim))
+    return normalize(corpus), normalize(queries)
+
+
+def load_evaluation_set(index_path: str, n_queries: int, seed: int = 0):
+    current_path = os.path.join(index_path, CURRENT_VERSION_FILE_NAME)
+    if os.path.exists(current_path):
+        with open(current_path, "r", encoding="utf-8") as file:
+            index_path = os.path.join(index_path, file.read().strip())
+    if os.path.exists(os.path.join(index_path, "full.npy")):
+        vectors = np.load(os.path.join(index_path, "full.npy"))
+    else:
+        codes = np.load(os.path.join(index_path, "codes.npy")).astype(np.float32)
+        vectors = normalize(codes * np.load(os.path.join(index_path, "scales.npy"))[:, None])
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(len(vectors), size=min(n_queries, len(vectors) // 2), replace=False)
+    corpus_rows = np.setdiff1d(np.arange(len(vectors)), query_rows)
+    return vectors[corpus_rows], vectors[query_rows]
+
+
+def run(corpus: np.ndarray, queries: np.ndarray, k: int, rescore_factor: int) -> None:
+    dim = corpus.shape[1]
+    print(f"corpus={len(corpus)} queries={len(queries)} dim={dim} k={k}")
+    print(f"{'storage':<18} {'bytes/vector':>12} {'recall@k':>9}")
+    print(f"{'float32':<18} {4 * dim:>12} {1.0:>9.4f}")
+    for dtype, code_bytes in (("float16", 2 * dim), ("int8", dim + 4)):
+        for rescore in (False, True):
+            recall = evaluate_recall(corpus, queries, k, dtype, rescore, rescore_factor)
+            label = f"{dtype}+rescore" if rescore else dtype
+            # Rescoring keeps the float32 vectors on disk next to the codes (only candidate rows are paged into memory)
+            stored_bytes = code_bytes + 4 * dim if rescore else code_bytes
+            print(f"{label:<18} {stored_bytes:>12} {recall:>9.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", help="Folder of a persisted QuantizedRag index.")
+    parser.add_argument("--n", type=int, default=10000, help="Synthetic corpus size.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.index:
+        corpus, queries = load_evaluation_set(args.index, args.queries)
+    else:
+        corpus, queries = make_evaluation_set(args.n, args.queries, args.dim)
+    run(corpus, queries, args.k, args.rescore_factor)
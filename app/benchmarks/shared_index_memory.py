@@ -0,0 +1,99 @@
+"""
+Memory use of several worker processes serving the same QuantizedRag index.
+
+Every worker opens the index, scores all of it and reads all of its documents, then reports how much its
+resident (RSS) and proportional (PSS) set size grew. PSS splits shared pages between the processes mapping
+them, so its total is the real memory cost of the workers. In "shared" mode the index is memory-mapped as
+QuantizedRag opens it; in "private" mode every worker copies it into its own memory, like a per-process
+vector store client does. Linux only (reads /proc/self/smaps_rollup).
+
+Run from the `app` folder:
+    python -m benchmarks.shared_index_memory --n 50000 --workers 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import tempfile
+from typing import Dict, List
+import numpy as np
+from langchain_core.documents.base import Document
+from langchain_core.embeddings import Embeddings
+from backend.rag_pipeline.quantized import QuantizedRag
+
+QUERY_ID = "query_1"
+
+
+class RandomEmbeddings(Embeddings):
+    """ Seeded random vectors, so the benchmark needs no embedding API. """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        rng = np.random.default_rng(len(texts))
+        return rng.normal(size=(len(texts), self.dim)).astype(np.float32).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def memory_kb() -> Dict[str, int]:
+    values = {}
+    with open("/proc/self/smaps_rollup", "r") as file:
+        for line in file:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key] = int(value.split()[0])
+    return values
+
+
+def worker(folder: str, dim: int, private: bool, results, done) -> None:
+    before = memory_kb()
+    rag = QuantizedRag(persist_directory=folder, embeddings=RandomEmbeddings(dim))
+    index = rag.get_vector_index_by_user_query(QUERY_ID)
+    if private:
+        index.codes, index.scales = np.array(index.codes), np.array(index.scales)
+        index.full_vectors = np.array(index.full_vectors)
+        index.ids, index.texts, index.metadatas = list(index.ids), list(index.texts), list(index.metadatas)
+    # Warm the whole index, as a long-running worker answering many questions would
+    index.similarity_search("warm up", k=10)
+    float(np.asarray(index.full_vectors).sum())
+    sum(len(text) for text in index.texts)
+    after = memory_kb()
+    results.put({key: after[key] - before[key] for key in after})
+    # Stay alive until all workers have reported, shared pages are only split between live processes
+    done.wait()
+
+
+def run(n: int, dim: int, worker_counts: List[int]) -> None:
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as folder:
+        documents = [Document(page_content=f"abstract {i} " + "lorem ipsum dolor " * 60, metadata={"title": f"title {i}"}) for i in range(n)]
+        QuantizedRag(persist_directory=folder, embeddings=RandomEmbeddings(dim)).create_vector_index_for_user_query(documents, QUERY_ID)
+
+        print(f"documents={n} dim={dim} (int8 codes + float32 vectors for rescoring)")
+        print(f"{'mode':<8} {'workers':>7} {'RSS MB':>9} {'PSS MB':>9} {'PSS MB/worker':>14}")
+        for mode in ("private", "shared"):
+            for count in worker_counts:
+                results, done = context.Queue(), context.Event()
+                processes = [
+                    context.Process(target=worker, args=(folder, dim, mode == "private", results, done))
+                    for _ in range(count)
+                ]
+                for process in processes:
+                    process.start()
+                reports = [results.get() for _ in processes]
+                done.set()
+                for process in processes:
+                    process.join()
+                rss = sum(report["Rss"] for report in reports) / 1024
+                pss = sum(report["Pss"] for report in reports) / 1024
+                print(f"{mode:<8} {count:>7} {rss:>9.1f} {pss:>9.1f} {pss / count:>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=50000, help="Number of documents in the index.")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    run(args.n, args.dim, args.workers)
@@ -0,0 +1,79 @@
+"""
+Compare read/write time and disk size of the abstract storage formats of LocalJSONStore.
+
+Run from the `app` folder:
+    python -m benchmarks.storage_format --n 10000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Callable, List
+from backend.data.models import ScientificAbstract
+from backend.data.local_data_store import LocalJSONStore, zstandard
+
+WORDS = (
+    "patients cohort randomized trial outcome risk therapy disease clinical inhibitor expression "
+    "gene protein cell tumor mortality treatment dose association analysis significant increase"
+).split()
+
+
+def make_abstracts(n: int, seed: int = 0) -> List[ScientificAbstract]:
+    rng = random.Random(seed)
+    return [
+        ScientificAbstract(
+            doi=f"10.1000/bench.{i}",
+            title=" ".join(rng.choices(WORDS, k=12)).capitalize(),
+            authors=", ".join(f"Author {rng.randint(1, 5000)}" for _ in range(6)),
+            year=rng.randint(1990, 2025),
+            abstract_content=" ".join(rng.choices(WORDS, k=250)),
+        )
+        for i in range(n)
+    ]
+
+
+def timed(function: Callable) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def folder_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+def run(n: int) -> None:
+    abstracts = make_abstracts(n)
+    formats = ["json", "jsonl"] + (["jsonl.zst"] if zstandard is not None else [])
+    print(f"{'format':<10} {'write s':>9} {'read s':>9} {'docs s':>9} {'size MB':>9}")
+    for storage_format in formats:
+        with tempfile.TemporaryDirectory() as folder:
+            store = LocalJSONStore(folder, storage_format=storage_format)
+            query_id = None
+
+            def write():
+                nonlocal query_id
+                query_id = store.save_dataset(abstracts, "benchmark query")
+
+            write_time = timed(write)
+            read_time = timed(lambda: store.read_dataset(query_id))
+            if storage_format == "json":
+                # The current path: validate into ScientificAbstract, then copy into Documents
+                docs_time = timed(lambda: store.create_document_list(store.read_dataset(query_id)))
+            else:
+                docs_time = timed(lambda: store.read_documents(query_id))
+            size = folder_size(os.path.join(folder, query_id)) / 1e6
+            print(f"{storage_format:<10} {write_time:>9.3f} {read_time:>9.3f} {docs_time:>9.3f} {size:>9.2f}")
+    if zstandard is None:
+        print("zstandard is not installed, skipped the 'jsonl.zst' format.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=10000, help="Number of synthetic abstracts.")
+    run(parser.parse_args().n)
@@ -1,24 +1,33 @@
-from typing import List
+from typing import Callable, Iterator, List, Optional
 import streamlit as st
 from langchain_core.documents.base import Document
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.runnables.base import Runnable
 from langchain_core.runnables.utils import Output
 from langchain_community.chat_message_histories import StreamlitChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.vectorstores import VectorStore
 
 
 class ChatAgent:
-    def __init__(self, prompt: ChatPromptTemplate, llm: Runnable):
+    def __init__(
+        self,
+        prompt: ChatPromptTemplate,
+        llm: Runnable,
+        history_factory: Optional[Callable[[str], BaseChatMessageHistory]] = None,
+    ):
         """
         Initialize the ChatAgent.
 
         Args:
         - prompt (ChatPromptTemplate): The chat prompt template.
         - llm (Runnable): The language model runnable.
+        - history_factory (Callable[[str], BaseChatMessageHistory]): Chat history by session ID. By default the history
+          is kept in the Streamlit session state, for use inside the Streamlit app.
         """
-        self.history = StreamlitChatMessageHistory(key="chat_history")
+        self.history_factory = history_factory
+        self.history = None if history_factory else StreamlitChatMessageHistory(key="chat_history")
         self.llm = llm
         self.prompt = prompt
         self.chain = self.setup_chain()
@@ -39,11 +48,17 @@ class ChatAgent:
         chain = self.prompt | self.llm
         return RunnableWithMessageHistory(
             chain,
-            lambda session_id: self.history,
+            self.get_session_history,
             input_messages_key="question",
             history_messages_key="history",
         )
 
+    def get_session_history(self, session_id: str) -> BaseChatMessageHistory:
+        """
+        Chat history of a session.
+        """
+        return self.history_factory(session_id) if self.history_factory else self.history
+
     def display_messages(self, selected_query: str) -> None:
         """
         Display messages in the chat interface.
@@ -64,17 +79,25 @@ class ChatAgent:
             formatted_strings.append(formatted_str)
         return "; ".join(formatted_strings)
     
-    def get_answer_from_llm(self, question: str, retrieved_documents: List[Document]) -> Output:
+    def get_answer_from_llm(self, question: str, retrieved_documents: List[Document], session_id: str = "any") -> Output:
         """
         Get response from LLM given user question and retrieved documents.
         """
-        config = {"configurable": {"session_id": "any"}}
+        config = {"configurable": {"session_id": session_id}}
         return self.chain.invoke(
             {
                 "question": question, 
                 "retrieved_abstracts": retrieved_documents,
             }, config
         )
+
+    def stream_answer_from_llm(self, question: str, retrieved_documents: List[Document], session_id: str) -> Iterator[str]:
+        """
+        Stream the LLM response chunk by chunk. The exchange is added to the session history once complete.
+        """
+        config = {"configurable": {"session_id": session_id}}
+        for chunk in self.chain.stream({"question": question, "retrieved_abstracts": retrieved_documents}, config):
+            yield chunk.content
     
     def retrieve_documents(self, retriever: VectorStore, question: str, cut_off: int = 5) -> List[Document]:
         """
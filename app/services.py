@@ -0,0 +1,124 @@
+from metapub import PubMedFetcher
+from components.prompts import qa_template
+from components.llm import llm
+from backend.retriever import CompositeAbstractRetriever, PubMedAbstractRetriever, PubMedMirror, PubMedMirrorRetriever
+from backend.data.local_data_store import LocalJSONStore
+from backend.data.lifecycle import StorageLifecycleManager
+from backend.rag_pipeline.chromadb import ChromaDbRag
+from backend.rag_pipeline.quantized import QuantizedRag
+from backend.rag_pipeline.embeddings import GeminiEmbeddingModel
+from backend.rag_pipeline.migration import EmbeddingMigrator
+from backend.rag_pipeline.passages import PassageRagWorkflow
+from backend.pipeline.answering import AnswerPipeline
+from backend.pipeline.local_first import CorpusIndex
+from backend.pipeline.progressive import ProgressiveIngestor
+from backend.pipeline.refresh import QueryRefresher, RefreshScheduler
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# Objects shared by the Streamlit app (app.py) and the HTTP API (api.py)
+embedding_model_name = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
+embeddings = GeminiEmbeddingModel(api_key=os.getenv("GOOGLE_API_KEY"), model_name=embedding_model_name)
+# Indexes built with another embedding model keep being queried with that model until migrated
+embeddings_factory = lambda model_name: GeminiEmbeddingModel(api_key=os.getenv("GOOGLE_API_KEY"), model_name=model_name)
+pubmed_client = PubMedAbstractRetriever(PubMedFetcher())
+data_repository = LocalJSONStore(storage_folder_path="backend/data")
+# Opt-in quantized embedding storage: set VECTOR_STORAGE_DTYPE to "int8" or "float16". VECTOR_STORAGE_RESCORE
+# also keeps float32 vectors to re-rank candidates exactly, at the cost of more disk than plain float32
+vector_storage_dtype = os.getenv("VECTOR_STORAGE_DTYPE")
+vector_storage_rescore = os.getenv("VECTOR_STORAGE_RESCORE", "").lower() in ("1", "true", "yes")
+if vector_storage_dtype:
+    rag_client = QuantizedRag(persist_directory="backend/quantized_storage", embeddings=embeddings, dtype=vector_storage_dtype, rescore=vector_storage_rescore, embeddings_factory=embeddings_factory)
+else:
+    rag_client = ChromaDbRag(persist_directory="backend/chromadb_storage", embeddings=embeddings, embeddings_factory=embeddings_factory)
+# Opt-in passage-level indexing: abstracts are indexed as overlapping sentence windows and answers
+# only get the relevant sentences of each retrieved abstract
+if os.getenv("PASSAGE_INDEX", "").lower() in ("1", "true", "yes"):
+    rag_client = PassageRagWorkflow(
+        rag_client,
+        window_size=int(os.getenv("PASSAGE_WINDOW_SENTENCES", "3")),
+        stride=int(os.getenv("PASSAGE_STRIDE_SENTENCES", "2")),
+    )
+storage_budget_mb = os.getenv("STORAGE_BUDGET_MB")
+storage_ttl_days = os.getenv("STORAGE_TTL_DAYS")
+# With a local PubMed mirror, the first batch comes from the mirror and the live service queried in parallel
+fast_retriever = None
+if os.getenv("PUBMED_MIRROR_PATH"):
+    fast_retriever = CompositeAbstractRetriever(
+        {
+            "pubmed": PubMedAbstractRetriever(PubMedFetcher(), simplify_query=False),
+            "mirror": PubMedMirrorRetriever(PubMedMirror(os.getenv("PUBMED_MIRROR_PATH"))),
+        },
+        deadline_seconds=float(os.getenv("RETRIEVER_DEADLINE_SECONDS", "5")),
+    )
+ingestor = ProgressiveIngestor(
+    pubmed_client,
+    data_repository,
+    rag_client,
+    max_abstracts=int(os.getenv("PUBMED_MAX_ABSTRACTS", "50")),
+    fast_retriever=fast_retriever,
+)
+# Opt-in local-first answering: new questions the stored abstracts already cover are answered from them,
+# PubMed is then only searched in the background to top the query up
+corpus_index = None
+corpus_storage_path = "backend/corpus_storage"
+if os.getenv("LOCAL_FIRST", "").lower() in ("1", "true", "yes"):
+    corpus_index = CorpusIndex(
+        data_repository,
+        QuantizedRag(persist_directory=corpus_storage_path, embeddings=embeddings, dtype=vector_storage_dtype or "int8", embeddings_factory=embeddings_factory),
+        state_path="backend/corpus_state.json",
+        min_similarity=float(os.getenv("LOCAL_FIRST_MIN_SIMILARITY", "0.75")),
+        min_abstracts=int(os.getenv("LOCAL_FIRST_MIN_ABSTRACTS", "5")),
+    )
+# The corpus index counts against the disk budget too, it shrinks as evicted queries are synced out of it
+storage_paths = [data_repository.storage_folder_path, rag_client.persist_directory]
+if corpus_index:
+    storage_paths.append(corpus_storage_path)
+lifecycle_manager = StorageLifecycleManager(
+    data_repository,
+    rag_client,
+    disk_budget_bytes=int(float(storage_budget_mb) * 1e6) if storage_budget_mb else None,
+    ttl_seconds=float(storage_ttl_days) * 86400 if storage_ttl_days else None,
+    storage_paths=storage_paths,
+    # Abstracts of deleted or evicted queries must stop answering from the corpus
+    on_delete=(lambda query_id: corpus_index.sync_in_background()) if corpus_index else None,
+)
+answer_pipeline = AnswerPipeline(
+    data_repository,
+    rag_client,
+    ingestor,
+    llm,
+    qa_template,
+    lifecycle_manager=lifecycle_manager,
+    corpus=corpus_index,
+    top_up=os.getenv("LOCAL_FIRST_TOP_UP", "true").lower() in ("1", "true", "yes"),
+)
+
+
+def start_refresh_scheduler(interval_hours: float) -> RefreshScheduler:
+    """ Start a scheduler that tops up hot queries with newly published abstracts. """
+    refresher = QueryRefresher(pubmed_client, data_repository, rag_client, ingestor=ingestor)
+    scheduler = RefreshScheduler(refresher, interval_seconds=interval_hours * 3600)
+    scheduler.start()
+    return scheduler
+
+
+def start_embedding_migration() -> EmbeddingMigrator:
+    """ Re-embed the vector indexes built with another embedding model in the background. """
+    migrator = EmbeddingMigrator(rag_client)
+    migrator.start()
+    return migrator
+
+
+def start_background_tasks() -> list:
+    """ Start the background tasks enabled in the environment. Call once per server process. """
+    tasks = []
+    if os.getenv("REFRESH_INTERVAL_HOURS"):
+        tasks.append(start_refresh_scheduler(float(os.getenv("REFRESH_INTERVAL_HOURS"))))
+    if os.getenv("MIGRATE_EMBEDDINGS", "").lower() in ("1", "true", "yes"):
+        tasks.append(start_embedding_migration())
+    if corpus_index:
+        # Index the abstracts stored before local-first answering was enabled
+        corpus_index.sync_in_background()
+    return tasks
\ No newline at end of file
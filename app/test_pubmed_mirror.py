@@ -0,0 +1,87 @@
+"""
+Tests of the local PubMed mirror on small synthetic XML fixtures (test_fixtures/pubmed):
+- pubmed24n0001.xml is a baseline file with articles 1-3 and article 4 without an abstract;
+- pubmed24n0002.xml is an update file revising article 1, removing the abstract of article 3,
+  adding article 5 and deleting article 2 with <DeleteCitation>.
+
+Run from the `app` folder:
+    python -m pytest test_pubmed_mirror.py   (or: python test_pubmed_mirror.py)
+"""
+import glob
+import os
+import tempfile
+from backend.retriever.pubmed_mirror import PubMedMirror, PubMedMirrorRetriever, iter_pubmed_articles, iter_pubmed_changes
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_fixtures", "pubmed")
+BASELINE = os.path.join(FIXTURES, "pubmed24n0001.xml")
+UPDATE = os.path.join(FIXTURES, "pubmed24n0002.xml")
+
+
+def pmids(mirror: PubMedMirror, query: str):
+    return sorted(abstract.pmid for abstract in mirror.search(query))
+
+
+def test_parse_baseline():
+    rows = {row[0]: row for row in iter_pubmed_articles(BASELINE)}
+    assert sorted(rows) == ["1", "2", "3"]
+    pmid, doi, title, authors, year, abstract = rows["1"]
+    assert doi == "10.1000/fixture.1"
+    assert authors == "Nguyen A, Caries Study Group"
+    assert year == 2019
+    assert abstract == "BACKGROUND: Dental caries is common in children. RESULTS: Fluoride varnish reduced caries incidence."
+    # DOI from the article ID list, year from MedlineDate, text of nested markup
+    assert rows["2"][1] == "10.1000/fixture.2" and rows["2"][4] == 2018
+    assert rows["3"][5] == "Vitamin D did not reduce fracture risk."
+
+
+def test_parse_update_changes():
+    changes = list(iter_pubmed_changes(UPDATE))
+    assert [pmid for pmid, _ in changes] == ["1", "3", "5", "2"]
+    assert [pmid for pmid, row in changes if row is None] == ["3", "2"]
+
+
+def test_baseline():
+    with tempfile.TemporaryDirectory() as folder:
+        mirror = PubMedMirror(os.path.join(folder, "mirror.db"))
+        assert mirror.load_file(BASELINE) == 3
+        assert mirror.count() == 3
+        assert pmids(mirror, "osteoporosis tooth loss") == ["2"]
+        assert PubMedMirrorRetriever(mirror).get_abstract_data("Does fluoride prevent dental caries?")[0].pmid == "1"
+
+
+def check_updated(mirror: PubMedMirror):
+    assert mirror.count() == 2
+    # Article 1 is replaced, also in the full-text index
+    [abstract] = mirror.search("fluoride caries")
+    assert abstract.title.endswith("(corrected)")
+    assert abstract.abstract_content.startswith("Corrected analysis")
+    assert pmids(mirror, "corrected") == ["1"]
+    assert pmids(mirror, "BACKGROUND common") == []
+    # Article 2 is deleted and article 3 lost its abstract: neither is searchable any more
+    assert pmids(mirror, "osteoporosis") == ["5"]
+    assert pmids(mirror, "vitamin fracture") == []
+
+
+def test_update_override_and_delete():
+    with tempfile.TemporaryDirectory() as folder:
+        mirror = PubMedMirror(os.path.join(folder, "mirror.db"))
+        mirror.load_file(BASELINE)
+        assert mirror.load_file(UPDATE) == 2
+        check_updated(mirror)
+
+
+def test_parallel_load():
+    with tempfile.TemporaryDirectory() as folder:
+        mirror = PubMedMirror(os.path.join(folder, "mirror.db"))
+        # Applied in file name order, whatever the order given; small batches exercise the chunked reads
+        assert mirror.load_files([UPDATE, BASELINE], workers=2, batch_size=1) == 5
+        check_updated(mirror)
+        # Staging databases are removed
+        assert glob.glob(os.path.join(folder, ".staging-*")) == []
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: OK")
\ No newline at end of file